@@ -3,9 +3,22 @@ import sys
 import os
 from pygame import mixer
 import ctypes
+import atexit
 import json
+import hashlib
+import io
+import re
+import signal
+import sqlite3
+import struct
+import threading
+import queue
 import traceback
-from collections import OrderedDict
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque
+from functools import lru_cache
+from math import ceil, cos, sin, pi
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from time import time
 import random
 
@@ -61,6 +74,157 @@ BTN = (40, 40, 40)
 BTN_H = (55, 55, 55)
 
 
+class TextCache:
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.entries = OrderedDict()
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, text, font_obj, color):
+        key = (text, font_obj, color)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        surf = font_obj.render(text, True, color)
+        size = surf.get_pitch() * surf.get_height()
+        self.entries[key] = (surf, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            _, (_, old_size) = self.entries.popitem(last=False)
+            self.bytes -= old_size
+            self.evictions += 1
+        return surf
+
+    def invalidate(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        ratio = self.hits / total * 100 if total else 0.0
+        return (f"text cache: {len(self.entries)} surfaces, {self.bytes / 1024:.0f} KiB, "
+                f"{ratio:.1f}% hits, {self.evictions} evicted")
+
+
+text_cache = TextCache()
+
+
+def render_text(text, font_obj, color, antialias=True):
+    return text_cache.render(text, font_obj, color)
+
+
+class DecorationCache:
+    def __init__(self):
+        self.surfaces = {}
+        self.builds = 0
+
+    def get(self, builder, size):
+        key = (builder, size, DPI_SCALE)
+        surf = self.surfaces.get(key)
+        if surf is None:
+            surf = builder(size)
+            self.surfaces[key] = surf
+            self.builds += 1
+        return surf
+
+    def invalidate(self):
+        self.surfaces.clear()
+
+    def stats(self):
+        return f"decorations: {len(self.surfaces)} cached, {self.builds} built"
+
+
+def build_header_gradient(size):
+    w, h = size
+    surf = pygame.Surface((w, h))
+    for i in range(h):
+        color = (BG[0] + int((GREEN_D[0] - BG[0]) * (1 - i / h) * 0.3),
+                 BG[1] + int((GREEN_D[1] - BG[1]) * (1 - i / h) * 0.3),
+                 BG[2] + int((GREEN_D[2] - BG[2]) * (1 - i / h) * 0.3))
+        draw.line(surf, color, (0, i), (w, i))
+    return surf.convert()
+
+
+def draw_art_gradient(surf, size):
+    for i in range(size):
+        ratio = i / size
+        color = (int(60 + ratio * 80), int(40 + ratio * 100), int(80 + ratio * 60))
+        draw.rect(surf, color, (0, i, size, 1))
+
+
+def build_thumb_placeholder(size):
+    surf = pygame.Surface((size, size))
+    draw_art_gradient(surf, size)
+    draw.circle(surf, (220, 220, 220), (size // 2 - 4, size // 2 + 6), 4, 2)
+    draw.circle(surf, (220, 220, 220), (size // 2 + 6, size // 2 + 4), 4, 2)
+    draw.line(surf, (220, 220, 220), (size // 2 + 2, size // 2 + 4), (size // 2 + 2, size // 2 - 8), 2)
+    return surf.convert()
+
+
+def build_art_placeholder(size):
+    surf = pygame.Surface((size, size))
+    draw_art_gradient(surf, size)
+    draw.circle(surf, GRAY_L, (size // 2 - 4, size // 2 + 8), 6, 2)
+    return surf.convert()
+
+
+def build_playlist_icon(size):
+    surf = pygame.Surface((size, size))
+    for i in range(size):
+        ratio = i / size
+        color = (int(30 + ratio * 50), int(215 - ratio * 100), int(96 - ratio * 20))
+        draw.rect(surf, color, (0, i, size, 1))
+    draw.rect(surf, GREEN, (0, 0, size, size), border_radius=6)
+    return surf.convert()
+
+
+decorations = DecorationCache()
+
+
+class DrawCallCounter:
+    FUNCTIONS = ("rect", "line", "lines", "aaline", "aalines", "circle", "ellipse", "arc", "polygon")
+
+    def __init__(self):
+        self.enabled = False
+        self.calls = 0
+        self.last_frame = 0
+        self.last_full = 0
+        for name in self.FUNCTIONS:
+            setattr(self, name, self._wrap(getattr(pygame.draw, name)))
+
+    def _wrap(self, fn):
+        def counted(*args, **kwargs):
+            if self.enabled:
+                self.calls += 1
+            return fn(*args, **kwargs)
+        return counted
+
+    def enable(self):
+        self.enabled = True
+        self.calls = 0
+
+    def disable(self):
+        self.enabled = False
+
+    def end_frame(self, full):
+        self.last_frame = self.calls
+        if full:
+            self.last_full = self.calls
+        self.calls = 0
+
+    def stats(self):
+        return f"draw calls: {self.last_frame} last frame, {self.last_full} last full redraw"
+
+
+draw = DrawCallCounter()
+
+
 def font(size, bold=False):
     scaled_size = int(size * min(DPI_SCALE, 1.2))
     try:
@@ -69,38 +233,134 @@ def font(size, bold=False):
         return pygame.font.SysFont("Arial", scaled_size, bold)
 
 
-F_LOGO = font(26, True)
-F_HEAD = font(36, True)
-F_SUB = font(16, True)
-F_BODY = font(14)
-F_BOLD = font(14, True)
-F_SMALL = font(12)
-F_TINY = font(11)
+def load_fonts():
+    global F_LOGO, F_HEAD, F_SUB, F_BODY, F_BOLD, F_SMALL, F_TINY
+    F_LOGO = font(26, True)
+    F_HEAD = font(36, True)
+    F_SUB = font(16, True)
+    F_BODY = font(14)
+    F_BOLD = font(14, True)
+    F_SMALL = font(12)
+    F_TINY = font(11)
+    text_cache.invalidate()
+
+
+def refresh_dpi():
+    global DPI_SCALE
+    scale = get_dpi_scale()
+    if scale != DPI_SCALE:
+        DPI_SCALE = scale
+        load_fonts()
+        decorations.invalidate()
+
+
+load_fonts()
 
 
 def format_time(sec):
     try:
-        return f"{int(sec // 60)}:{int(sec % 60):02d}"
+        sec = int(sec)
+        if sec >= 3600:
+            return f"{sec // 3600}:{sec % 3600 // 60:02d}:{sec % 60:02d}"
+        return f"{sec // 60}:{sec % 60:02d}"
     except Exception:
         return "0:00"
 
 
+@lru_cache(maxsize=4096)
+def _format_whole_seconds(sec):
+    return format_time(sec)
+
+
+def format_duration(seconds):
+    if not seconds:
+        return "-:--"
+    return _format_whole_seconds(int(seconds))
+
+
 REPEAT_OFF, REPEAT_ALL, REPEAT_ONE = 0, 1, 2
 
 APP_DIR = os.path.dirname(__file__) if os.path.dirname(__file__) else os.getcwd()
 SETTINGS_FILE = os.path.join(APP_DIR, "settings.json")
 PLAYLIST_FILE = os.path.join(APP_DIR, "playlists.json")
+PLAYLIST_JOURNAL_FILE = os.path.join(APP_DIR, "playlists.journal")
 HISTORY_FILE = os.path.join(APP_DIR, "history.json")
+LIBRARY_INDEX_FILE = os.path.join(APP_DIR, "library_index.db")
+ALBUM_ART_PACK_FILE = os.path.join(APP_DIR, "album_art.pack")
+SCAN_BATCH_SIZE = 256
+FALLBACK_TRACK_LENGTH = 180.0
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.ogg', '.flac')
 
 DEFAULT_SETTINGS = {
     "music_folder": os.path.join(APP_DIR, "music"),
     "volume": 0.7,
     "repeat_mode": REPEAT_OFF,
     "last_open_playlist": None,
-    "mini_player": False
+    "mini_player": False,
+    "scan_workers": 8,
+    "watch_folder": True,
+    "crossfade_seconds": 0
 }
 
 
+class PersistenceManager:
+    FLUSH_INTERVAL = 2.0
+
+    def __init__(self):
+        self.writers = {}
+        self.dirty = {}
+        self.writes = 0
+        self.avoided = 0
+
+    def register(self, name, path, producer, on_written=None):
+        self.writers[name] = (path, producer, on_written)
+
+    def mark(self, name):
+        if name in self.dirty:
+            self.avoided += 1
+        else:
+            self.dirty[name] = time()
+
+    def next_flush_ms(self):
+        if not self.dirty:
+            return None
+        due = min(self.dirty.values()) + self.FLUSH_INTERVAL
+        return max(1, int((due - time()) * 1000) + 1)
+
+    def flush(self, force=False):
+        now = time()
+        for name, since in list(self.dirty.items()):
+            if force or now - since >= self.FLUSH_INTERVAL:
+                del self.dirty[name]
+                path, producer, on_written = self.writers[name]
+                if not self._write(name, path, producer()):
+                    self.dirty.setdefault(name, now)
+                elif on_written:
+                    on_written()
+
+    def _write(self, name, path, data):
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            self.writes += 1
+            return True
+        except (IOError, OSError) as e:
+            print(f"Failed to save {name}:", e)
+            return False
+
+    def stats(self):
+        return f"persistence: {self.writes} writes, {self.avoided} avoided, {len(self.dirty)} pending"
+
+
+persistence = PersistenceManager()
+atexit.register(persistence.flush, force=True)
+signal.signal(signal.SIGTERM, lambda signum, frame: pygame.event.post(pygame.event.Event(pygame.QUIT)))
+
+
 def load_settings():
     try:
         if os.path.exists(SETTINGS_FILE):
@@ -116,14 +376,11 @@ def load_settings():
 
 
 def save_settings():
-    try:
-        with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-            json.dump(settings, f, indent=2)
-    except IOError as e:
-        print("Failed to save settings:", e)
+    persistence.mark("settings")
 
 
 settings = load_settings()
+persistence.register("settings", SETTINGS_FILE, lambda: settings)
 
 
 def load_history():
@@ -137,14 +394,11 @@ def load_history():
 
 
 def save_history():
-    try:
-        with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-            json.dump(play_history[-50:], f, indent=2)
-    except IOError:
-        pass
+    persistence.mark("history")
 
 
 play_history = load_history()
+persistence.register("history", HISTORY_FILE, lambda: play_history[-50:])
 
 
 def log_exception(msg=None):
@@ -196,13 +450,38 @@ def find_music_folders():
     return potential_folders
 
 
+def is_audio_file(name):
+    return name.lower().endswith(AUDIO_EXTENSIONS)
+
+
+def iter_audio_files(folder):
+    stack = [folder]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except (FileNotFoundError, NotADirectoryError, PermissionError, OSError) as e:
+            if current == folder:
+                raise
+            print("Skipping unreadable folder:", e)
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif is_audio_file(entry.name) and entry.is_file():
+                    yield entry.path, entry.stat()
+            except OSError:
+                continue
+
+
 music_folder = settings.get("music_folder", DEFAULT_SETTINGS["music_folder"])
 try:
     folder_exists = os.path.exists(music_folder)
     has_audio = False
     if folder_exists:
-        has_audio = any(f.lower().endswith(('.mp3', '.wav', '.ogg', '.flac')) for f in os.listdir(music_folder) if
-                        os.path.isfile(os.path.join(music_folder, f)))
+        has_audio = any(True for _ in iter_audio_files(music_folder))
 except (PermissionError, OSError):
     folder_exists = False
     has_audio = False
@@ -225,72 +504,1249 @@ if not folder_exists or not has_audio:
             print("Could not create music folder:", e)
 
 
-def scan_music_folder(folder):
+class LibraryIndex:
+    SCHEMA_VERSION = 2
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        try:
+            self.conn = sqlite3.connect(path)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.migrate(self.conn)
+        except sqlite3.Error as e:
+            print("Failed to open library index:", e)
+            self.close()
+
+    @classmethod
+    def migrate(cls, conn):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != cls.SCHEMA_VERSION:
+                if version != 1:
+                    conn.execute("DROP TABLE IF EXISTS tracks")
+                conn.execute("DROP TABLE IF EXISTS art")
+                conn.execute("CREATE TABLE IF NOT EXISTS tracks (path TEXT PRIMARY KEY, mtime REAL, size INTEGER, "
+                             "title TEXT, artist TEXT, length REAL) WITHOUT ROWID")
+                conn.execute("CREATE TABLE IF NOT EXISTS art_paths (path TEXT PRIMARY KEY, mtime REAL, digest TEXT) "
+                             "WITHOUT ROWID")
+                conn.execute("CREATE TABLE IF NOT EXISTS art_images (digest TEXT, size INTEGER, offset INTEGER, "
+                             "width INTEGER, height INTEGER, PRIMARY KEY (digest, size)) WITHOUT ROWID")
+                conn.execute(f"PRAGMA user_version = {cls.SCHEMA_VERSION}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+    def load(self):
+        entries = {}
+        if not self.conn:
+            return entries
+        try:
+            for path, mtime, size, title, artist, length in self.conn.execute(
+                    "SELECT path, mtime, size, title, artist, length FROM tracks"):
+                entries[path] = (mtime, size, title, artist, length)
+        except sqlite3.Error as e:
+            print("Failed to read library index:", e)
+        return entries
+
+    def store(self, rows):
+        if not self.conn or not rows:
+            return
+        try:
+            self.conn.executemany("INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print("Failed to update library index:", e)
+
+    def discard(self, paths):
+        if not self.conn or not paths:
+            return
+        try:
+            self.conn.executemany("DELETE FROM tracks WHERE path = ?", [(p,) for p in paths])
+            self.conn.executemany("DELETE FROM art_paths WHERE path = ?", [(p,) for p in paths])
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print("Failed to update library index:", e)
+
+    def update_length(self, path, length):
+        if not self.conn:
+            return
+        try:
+            self.conn.execute("UPDATE tracks SET length = ? WHERE path = ?", (length, path))
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print("Failed to update library index:", e)
+
+    def rename(self, pairs):
+        if not self.conn or not pairs:
+            return
+        try:
+            self.conn.executemany("UPDATE OR REPLACE tracks SET path = ? WHERE path = ?",
+                                  [(new, old) for old, new in pairs])
+            self.conn.executemany("UPDATE OR REPLACE art_paths SET path = ? WHERE path = ?",
+                                  [(new, old) for old, new in pairs])
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print("Failed to update library index:", e)
+
+    def close(self):
+        if self.conn:
+            try:
+                self.conn.close()
+            except sqlite3.Error:
+                pass
+        self.conn = None
+
+
+def read_track_tags(path):
+    title = os.path.splitext(os.path.basename(path))[0]
+    artist = "Unknown"
+    length = 0.0
+    try:
+        if not path.lower().endswith(".mp3"):
+            import mutagen
+            audio = mutagen.File(path, easy=True)
+            if audio is not None:
+                if audio.info and getattr(audio.info, "length", None):
+                    length = float(audio.info.length)
+                if audio.tags:
+                    artist = (audio.tags.get("artist") or [artist])[0]
+                    title = (audio.tags.get("title") or [title])[0]
+            return title, artist, length
+        from mutagen.mp3 import MP3
+        from mutagen.id3 import ID3
+        audio = MP3(path, ID3=ID3)
+        if audio.info and getattr(audio.info, "length", None):
+            length = float(audio.info.length)
+        if audio.tags:
+            if 'TPE1' in audio.tags:
+                artist = str(audio.tags['TPE1'])
+            if 'TIT2' in audio.tags:
+                title = str(audio.tags['TIT2'])
+    except (ImportError, Exception) as e:
+        print(f"Warning: couldn't read metadata for {path}: {e}")
+    return title, artist, length
+
+
+class Track:
+    __slots__ = ("file", "title", "artist", "length")
+    _KEYS = {"id": "file", "file": "file", "title": "title", "artist": "artist", "length": "length"}
+
+    def __init__(self, file, title, artist, length):
+        self.file = file
+        self.title = title
+        self.artist = sys.intern(artist)
+        self.length = float(length) if length else 0.0
+
+    @property
+    def id(self):
+        return self.file
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self._KEYS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key == "artist":
+            value = sys.intern(value)
+        try:
+            setattr(self, self._KEYS[key], value)
+        except KeyError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f"Track({self.file!r}, {self.title!r}, {self.artist!r}, {self.length!r})"
+
+
+def make_track(path, title, artist, length):
+    return Track(path, title, artist, length)
+
+
+def benchmark_track_store(count=100000):
+    import tracemalloc
+    rows = [(f"/music/Artist {i % 500}/Album {i % 40}/Track {i:06d}.mp3", f"Track {i:06d}", i % 500, 120.5 + i % 300)
+            for i in range(count)]
+
+    def build_dicts():
+        return [{"title": title, "artist": f"Artist {a}", "duration": format_time(length), "file": path,
+                 "id": path} for path, title, a, length in rows]
+
+    def build_tracks():
+        return [Track(path, title, f"Artist {a}", length) for path, title, a, length in rows]
+
+    def scan_dicts(lib):
+        lib.sort(key=lambda x: x["title"].lower())
+        return sum(1 for t in lib if "artist 42" in t["artist"].lower())
+
+    def scan_tracks(lib):
+        lib.sort(key=lambda x: x.title.lower())
+        return sum(1 for t in lib if "artist 42" in t.artist.lower())
+
+    print(f"Track store benchmark, {count:,} tracks")
+    for name, build, scan in (("dict", build_dicts, scan_dicts), ("Track", build_tracks, scan_tracks)):
+        tracemalloc.start()
+        lib = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        start = time()
+        hits = scan(lib)
+        elapsed = time() - start
+        print(f"{name:>6}: {size / count:6.1f} bytes/track, sort + scan {elapsed * 1000:6.1f} ms ({hits} hits)")
+        del lib
+
+
+if "--bench-store" in sys.argv:
+    benchmark_track_store()
+    pygame.quit()
+    sys.exit()
+
+
+def scan_music_folder(folder, workers=None, on_batch=None, on_progress=None, cancel=None, snapshot=None):
     lib = []
+    if workers is None:
+        workers = settings.get("scan_workers", DEFAULT_SETTINGS["scan_workers"])
+    workers = max(1, int(workers))
+
+    index = LibraryIndex(LIBRARY_INDEX_FILE)
+    cached = index.load()
+    pending = []
+    seen = set()
     try:
-        files = os.listdir(folder)
-    except (FileNotFoundError, PermissionError) as e:
+        for path, st in iter_audio_files(folder):
+            if cancel is not None and cancel.is_set():
+                break
+            seen.add(path)
+            if snapshot is not None:
+                snapshot[path] = (st.st_mtime, st.st_size)
+            entry = cached.get(path)
+            if entry and entry[0] == st.st_mtime and entry[1] == st.st_size:
+                lib.append(make_track(path, entry[2], entry[3], entry[4]))
+            else:
+                pending.append((path, st.st_mtime, st.st_size))
+    except (FileNotFoundError, NotADirectoryError, PermissionError, OSError) as e:
         print("Music folder not accessible:", e)
+        index.close()
         return lib
 
-    for f in files:
-        if f.lower().endswith(('.mp3', '.wav', '.ogg', '.flac')):
-            path = os.path.join(folder, f)
-            title = os.path.splitext(f)[0]
-            artist = "Unknown"
-            duration = "3:30"
-            try:
-                from mutagen.mp3 import MP3
-                from mutagen.id3 import ID3
-                audio = MP3(path, ID3=ID3)
-                if audio.info and getattr(audio.info, "length", None):
-                    duration = format_time(int(audio.info.length))
-                if audio.tags:
-                    if 'TPE1' in audio.tags:
-                        artist = str(audio.tags['TPE1'])
-                    if 'TIT2' in audio.tags:
-                        title = str(audio.tags['TIT2'])
-            except (ImportError, Exception) as e:
-                print(f"Warning: couldn't read metadata for {path}: {e}")
-            lib.append({
-                "title": title,
-                "artist": artist,
-                "duration": duration,
-                "file": path,
-                "id": path
-            })
-    lib.sort(key=lambda x: x["title"].lower())
+    total = len(lib) + len(pending)
+    batch = []
+
+    def emit(track, flush=False):
+        if track is not None:
+            batch.append(track)
+        if batch and (flush or len(batch) >= SCAN_BATCH_SIZE):
+            if on_batch:
+                on_batch(list(batch))
+            batch.clear()
+            if on_progress:
+                on_progress(done, total)
+
+    done = 0
+    for track in lib:
+        done += 1
+        emit(track)
+
+    changed = []
+    if pending:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(read_track_tags, path): (path, mtime, size) for path, mtime, size in pending}
+            for future in as_completed(futures):
+                if cancel is not None and cancel.is_set():
+                    for f in futures:
+                        f.cancel()
+                    break
+                path, mtime, size = futures[future]
+                title, artist, length = future.result()
+                changed.append((path, mtime, size, title, artist, length))
+                track = make_track(path, title, artist, length)
+                lib.append(track)
+                done += 1
+                emit(track)
+    index.store(changed)
+    if cancel is not None and cancel.is_set():
+        index.close()
+        return lib
+    emit(None, flush=True)
+    if on_progress:
+        on_progress(done, total)
+
+    prefix = os.path.join(folder, "")
+    stale = [p for p in cached if p.startswith(prefix) and p not in seen]
+    index.discard(stale)
+    index.close()
+    lib.sort(key=lambda x: x.title.lower())
     return lib
 
 
-music_library = scan_music_folder(music_folder)
-if not music_library:
-    music_library = [
-        {"title": "Drop audio files", "artist": "in /music folder", "duration": "0:00", "file": None, "id": "demo_0"},
-    ]
+class LibraryWatcher:
+    POLL_INTERVAL = 5.0
+    SETTLE_TIME = 0.5
+    MAX_SETTLE = 2.0
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, folder, known, publish):
+        self.folder = folder
+        self.known = dict(known)
+        self.publish = publish
+        self.stop_event = threading.Event()
+        self.libc = None
+        self.fd = None
+        self.watches = {}
+        self.index = None
+        self.mode = None
+
+    def start(self):
+        threading.Thread(target=self.run, name="library-watch", daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        self.index = LibraryIndex(LIBRARY_INDEX_FILE)
+        try:
+            if self._init_inotify():
+                self.mode = "inotify"
+                self._run_inotify()
+            else:
+                self.mode = "polling"
+                self._run_polling()
+        except Exception:
+            log_exception("Library watcher stopped")
+        finally:
+            if self.fd is not None:
+                try:
+                    os.close(self.fd)
+                except OSError:
+                    pass
+                self.fd = None
+            self.index.close()
+
+    def _init_inotify(self):
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            import ctypes.util
+            self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            print("inotify unavailable, polling music folder instead:", e)
+            return False
+        if fd < 0:
+            return False
+        self.fd = fd
+        if not self._watch_tree(self.folder):
+            print("inotify watch limit reached, polling music folder instead")
+            os.close(self.fd)
+            self.fd = None
+            self.watches = {}
+            return False
+        return True
+
+    def _watch_tree(self, root):
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+            if wd < 0:
+                if ctypes.get_errno() == 28:
+                    return False
+                continue
+            self.watches[wd] = path
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+            except OSError:
+                continue
+        return True
+
+    def _read_events(self):
+        try:
+            data = os.read(self.fd, 65536)
+        except (BlockingIOError, InterruptedError):
+            return []
+        events = []
+        offset = 0
+        while offset + 16 <= len(data):
+            wd, mask, cookie, length = struct.unpack_from("iIII", data, offset)
+            name = data[offset + 16:offset + 16 + length].rstrip(b"\0")
+            offset += 16 + length
+            events.append((wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def _run_inotify(self):
+        import select
+        while not self.stop_event.is_set():
+            ready, _, _ = select.select([self.fd], [], [], 1.0)
+            if not ready:
+                continue
+            events = self._read_events()
+            deadline = time() + self.MAX_SETTLE
+            while time() < deadline and not self.stop_event.is_set():
+                ready, _, _ = select.select([self.fd], [], [], self.SETTLE_TIME)
+                if not ready:
+                    break
+                events.extend(self._read_events())
+            if not self.stop_event.is_set():
+                self._handle_events(events)
+
+    def _known_under(self, folder):
+        prefix = os.path.join(folder, "")
+        return [p for p in self.known if p.startswith(prefix)]
+
+    def _handle_events(self, events):
+        dirty = set()
+        moved_from = {}
+        moved_to = {}
+        overflow = False
+        for wd, mask, cookie, name in events:
+            if mask & self.IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            base = self.watches.get(wd)
+            if base is None:
+                continue
+            if mask & self.IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            path = os.path.join(base, name)
+            is_dir = bool(mask & self.IN_ISDIR)
+            if mask & self.IN_MOVED_FROM:
+                moved_from[cookie] = (path, is_dir)
+            elif mask & self.IN_MOVED_TO:
+                moved_to[cookie] = (path, is_dir)
+            elif is_dir:
+                if mask & self.IN_CREATE:
+                    self._watch_tree(path)
+                    dirty.update(self._snapshot(path))
+                elif mask & self.IN_DELETE:
+                    dirty.update(self._known_under(path))
+            else:
+                dirty.add(path)
+
+        renamed = []
+        for cookie, (old, is_dir) in moved_from.items():
+            target = moved_to.pop(cookie, None)
+            if target is None:
+                dirty.update(self._known_under(old) if is_dir else [old])
+                continue
+            new = target[0]
+            if is_dir:
+                prefix = os.path.join(old, "")
+                for wd, p in list(self.watches.items()):
+                    if p == old or p.startswith(prefix):
+                        self.watches[wd] = new + p[len(old):]
+                renamed.extend((p, new + p[len(old):]) for p in self._known_under(old))
+            else:
+                renamed.append((old, new))
+        for new, is_dir in moved_to.values():
+            if is_dir:
+                self._watch_tree(new)
+                dirty.update(self._snapshot(new))
+            else:
+                dirty.add(new)
+
+        if overflow:
+            dirty.update(self.known)
+            dirty.update(self._snapshot(self.folder))
+        self._reconcile(dirty, renamed)
 
+    def _snapshot(self, folder):
+        snapshot = {}
+        try:
+            for path, st in iter_audio_files(folder):
+                snapshot[path] = (st.st_mtime, st.st_size)
+        except OSError:
+            pass
+        return snapshot
+
+    def _run_polling(self):
+        while not self.stop_event.wait(self.POLL_INTERVAL):
+            current = self._snapshot(self.folder)
+            removed = [p for p in self.known if p not in current]
+            changed = [p for p, sig in current.items() if self.known.get(p) != sig]
+            by_signature = {}
+            for p in removed:
+                by_signature.setdefault(self.known[p], []).append(p)
+            renamed = []
+            for p in changed:
+                candidates = by_signature.get(current[p])
+                if p not in self.known and candidates:
+                    renamed.append((candidates.pop(), p))
+            moved = {p for pair in renamed for p in pair}
+            dirty = {p for p in removed + changed if p not in moved}
+            self._reconcile(dirty, renamed)
+
+    def _reconcile(self, dirty, renamed):
+        renames = []
+        for old, new in renamed:
+            if old in self.known and is_audio_file(new) and os.path.isfile(new):
+                self.known[new] = self.known.pop(old)
+                renames.append((old, new))
+                dirty.discard(new)
+            else:
+                dirty.add(old)
+                dirty.add(new)
 
-def load_playlists():
+        added = []
+        removed = []
+        for path in dirty:
+            if not is_audio_file(path):
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            if st is None:
+                if self.known.pop(path, None) is not None:
+                    removed.append(path)
+                continue
+            signature = (st.st_mtime, st.st_size)
+            if self.known.get(path) != signature:
+                self.known[path] = signature
+                added.append((path, signature))
+
+        if self.stop_event.is_set():
+            return
+        rows = []
+        tracks = []
+        for path, (mtime, size) in added:
+            title, artist, length = read_track_tags(path)
+            rows.append((path, mtime, size, title, artist, length))
+            tracks.append(make_track(path, title, artist, length))
+        self.index.rename(renames)
+        self.index.store(rows)
+        self.index.discard(removed)
+        if renames:
+            self.publish("renamed", renames)
+        if tracks:
+            self.publish("added", tracks)
+        if removed:
+            self.publish("removed", removed)
+
+
+def probe_track_length(path):
     try:
-        if os.path.exists(PLAYLIST_FILE):
-            with open(PLAYLIST_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if isinstance(data, dict):
-                    return data
-    except (json.JSONDecodeError, IOError) as e:
-        print("Failed to load playlists:", e)
-    return {"Liked Songs": [], "My Playlist": [], "Chill": []}
+        import mutagen
+        audio = mutagen.File(path)
+        if audio is not None and audio.info and getattr(audio.info, "length", None):
+            return float(audio.info.length)
+    except (ImportError, Exception):
+        pass
+    try:
+        return float(mixer.Sound(path).get_length())
+    except (pygame.error, Exception) as e:
+        print(f"Warning: couldn't determine length of {path}: {e}")
+    return 0.0
+
+
+class LengthProber:
+    def __init__(self):
+        self.results = queue.Queue()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="length-probe")
+        self.pending = set()
+
+    def request(self, path):
+        if not path or path in self.pending:
+            return
+        self.pending.add(path)
+        self.pool.submit(self._probe, path)
+
+    def _probe(self, path):
+        length = probe_track_length(path)
+        if length > 0:
+            index = LibraryIndex(LIBRARY_INDEX_FILE)
+            index.update_length(path, length)
+            index.close()
+        self.results.put((path, length))
+
+    def poll(self):
+        done = []
+        while True:
+            try:
+                path, length = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.discard(path)
+            done.append((path, length))
+        return done
+
+
+class LibraryScanner:
+    MERGE_CHUNK = 64
+    REFRESH_MS = 500
+
+    def __init__(self):
+        self.events = queue.Queue()
+        self.pending = deque()
+        self.backlog = False
+        self.unsorted = False
+        self.refreshed_at = 0
+        self.generation = 0
+        self.cancel_event = None
+        self.watcher = None
+        self.lock = threading.Lock()
+        self.active = False
+        self.scanned = 0
+        self.total = 0
+
+    def stop(self):
+        if self.cancel_event:
+            self.cancel_event.set()
+        with self.lock:
+            if self.watcher:
+                self.watcher.stop()
+                self.watcher = None
+
+    def start(self, folder):
+        self.stop()
+        self.generation += 1
+        generation = self.generation
+        cancel_event = threading.Event()
+        self.cancel_event = cancel_event
+        self.pending.clear()
+        self.active = True
+        self.scanned = 0
+        self.total = 0
+
+        def publish(kind, data):
+            self.events.put((generation, kind, data))
+
+        def run():
+            snapshot = {}
+            try:
+                scan_music_folder(folder,
+                                  on_batch=lambda batch: publish("batch", batch),
+                                  on_progress=lambda done, total: publish("progress", (done, total)),
+                                  cancel=cancel_event,
+                                  snapshot=snapshot)
+            except Exception:
+                log_exception("Library scan failed")
+            publish("done", None)
+            if settings.get("watch_folder", True):
+                with self.lock:
+                    if not cancel_event.is_set():
+                        self.watcher = LibraryWatcher(folder, snapshot, publish)
+                        self.watcher.start()
+
+        threading.Thread(target=run, name="library-scan", daemon=True).start()
+
+    def poll(self, budget_ms=6):
+        deadline = time() + budget_ms / 1000.0
+        self.backlog = True
+        while time() < deadline:
+            if not self.pending:
+                try:
+                    generation, kind, data = self.events.get_nowait()
+                except queue.Empty:
+                    self.backlog = False
+                    return
+                if generation != self.generation:
+                    continue
+                if kind == "progress":
+                    self.scanned, self.total = data
+                    continue
+                self.pending.append((kind, data))
+            kind, data = self.pending.popleft()
+            if kind in ("batch", "added") and len(data) > self.MERGE_CHUNK:
+                self.pending.appendleft((kind, data[self.MERGE_CHUNK:]))
+                data = data[:self.MERGE_CHUNK]
+            elif kind == "done":
+                self.active = False
+            yield kind, data
+
+
+class SearchIndex:
+    FIELDS = (("title", 3), ("artist", 2), ("album", 1))
+    MATCH_EXACT = 4
+    MATCH_PREFIX = 2
+    MATCH_FUZZY = 1
+    FUZZY_MIN_LEN = 4
+    SCORE_LIMIT = 5000
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self._clear()
+
+    def add(self, track):
+        with self.lock:
+            self._add(track)
+
+    def remove(self, track_id):
+        with self.lock:
+            self._remove(track_id)
+
+    def search(self, query, within=None):
+        with self.lock:
+            return self._search(query, within)
+
+    def estimate(self, query, limit):
+        if not self.lock.acquire(blocking=False):
+            return limit + 1
+        try:
+            cost = 0
+            for term in self.tokenize(query):
+                lo = bisect_left(self.vocab, term)
+                hi = bisect_left(self.vocab, term + "\uffff", lo)
+                cost += hi - lo
+                for token in self.vocab[lo:hi]:
+                    cost += len(self.postings[token])
+                    if cost > limit:
+                        return cost
+            return cost
+        finally:
+            self.lock.release()
+
+    def _clear(self):
+        self.postings = {}
+        self.doc_tokens = {}
+        self.sort_keys = {}
+        self.vocab = []
+        self.deletes = {}
+
+    @staticmethod
+    def tokenize(text):
+        return re.findall(r"\w+", text.lower())
+
+    @staticmethod
+    def _deletions(token):
+        return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+    @staticmethod
+    def _within_one_edit(a, b):
+        if a == b:
+            return True
+        la, lb = len(a), len(b)
+        if abs(la - lb) > 1:
+            return False
+        if la == lb:
+            diff = [i for i in range(la) if a[i] != b[i]]
+            if len(diff) == 1:
+                return True
+            return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+        if la > lb:
+            a, b = b, a
+        i = 0
+        while i < len(a) and a[i] == b[i]:
+            i += 1
+        return a[i:] == b[i + 1:]
+
+    def _add(self, track):
+        track_id = track["id"]
+        if track_id in self.doc_tokens:
+            self._remove(track_id)
+        tokens = {}
+        for name, weight in self.FIELDS:
+            for token in self.tokenize(track.get(name) or ""):
+                if weight > tokens.get(token, 0):
+                    tokens[token] = weight
+        self.doc_tokens[track_id] = tokens
+        self.sort_keys[track_id] = track["title"].lower()
+        for token in tokens:
+            docs = self.postings.get(token)
+            if docs is None:
+                self.postings[token] = {track_id}
+                self._index_token(token)
+            else:
+                docs.add(track_id)
+
+    def _remove(self, track_id):
+        tokens = self.doc_tokens.pop(track_id, None)
+        if tokens is None:
+            return
+        self.sort_keys.pop(track_id, None)
+        for token in tokens:
+            docs = self.postings.get(token)
+            if docs is not None:
+                docs.discard(track_id)
+                if not docs:
+                    del self.postings[token]
+                    self._unindex_token(token)
+
+    def _index_token(self, token):
+        insort(self.vocab, token)
+        if len(token) >= self.FUZZY_MIN_LEN - 1:
+            for d in self._deletions(token) | {token}:
+                self.deletes.setdefault(d, []).append(token)
+
+    def _unindex_token(self, token):
+        i = bisect_left(self.vocab, token)
+        if i < len(self.vocab) and self.vocab[i] == token:
+            del self.vocab[i]
+        if len(token) >= self.FUZZY_MIN_LEN - 1:
+            for d in self._deletions(token) | {token}:
+                tokens = self.deletes.get(d)
+                if tokens is not None:
+                    tokens.remove(token)
+                    if not tokens:
+                        del self.deletes[d]
+
+    def _fuzzy_candidates(self, term):
+        found = set()
+        for d in self._deletions(term) | {term}:
+            found.update(self.deletes.get(d, ()))
+        return [t for t in found if self._within_one_edit(term, t)]
+
+    def _expand(self, term):
+        matches = {}
+        lo = bisect_left(self.vocab, term)
+        hi = bisect_left(self.vocab, term + "\uffff", lo)
+        for token in self.vocab[lo:hi]:
+            matches[token] = self.MATCH_PREFIX
+        if term in self.postings:
+            matches[term] = self.MATCH_EXACT
+        if len(term) >= self.FUZZY_MIN_LEN:
+            for token in self._fuzzy_candidates(term):
+                matches.setdefault(token, self.MATCH_FUZZY)
+        return matches
+
+    def _search(self, query, within=None):
+        terms = self.tokenize(query)
+        if not terms:
+            return []
+        expansions = []
+        for term in terms:
+            matches = self._expand(term)
+            if not matches:
+                return []
+            expansions.append(matches)
+        if within is not None:
+            candidates = {t for t in within if t in self.doc_tokens and
+                          all(not matches.keys().isdisjoint(self.doc_tokens[t]) for matches in expansions)}
+        else:
+            doc_sets = sorted((set().union(*(self.postings[t] for t in matches)) for matches in expansions), key=len)
+            candidates = doc_sets[0]
+            for docs in doc_sets[1:]:
+                candidates = candidates & docs
+                if not candidates:
+                    return []
+        if len(candidates) > self.SCORE_LIMIT:
+            return sorted(candidates, key=self.sort_keys.__getitem__)
+        scores = {}
+        for track_id in candidates:
+            tokens = self.doc_tokens[track_id]
+            score = 0
+            for matches in expansions:
+                best = 0
+                for token, weight in tokens.items():
+                    quality = matches.get(token)
+                    if quality and quality * weight > best:
+                        best = quality * weight
+                score += best
+            scores[track_id] = score
+        return sorted(candidates, key=lambda t: (-scores[t], self.sort_keys[t]))
+
+
+class SearchEngine:
+    CACHE_SIZE = 32
+    SYNC_COST = 20000
+    DEBOUNCE_MS = 150
+
+    def __init__(self, index):
+        self.index = index
+        self.recent = OrderedDict()
+        self.query = ""
+        self.results = []
+        self.results_key = None
+        self.wanted = None
+        self.typed_at = 0
+        self.generation = 0
+        self.running = False
+        self.library_version = None
+        self.done = queue.Queue()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self.narrowed = 0
+        self.cached = 0
+        self.background = 0
+
+    def set_query(self, query):
+        if query != self.query:
+            self.query = query
+            self.wanted = query
+            self.typed_at = pygame.time.get_ticks()
+
+    def invalidate(self):
+        self.recent.clear()
+        self.results_key = None
+        self.wanted = self.query
+
+    def busy(self):
+        return self.wanted is not None or self.running
+
+    @staticmethod
+    def _narrows(old, new):
+        if not old or len(new) < len(old) or new[:len(old) - 1] != old[:-1]:
+            return False
+        last_old, last_new = old[-1], new[len(old) - 1]
+        if last_new == last_old:
+            return True
+        return last_new.startswith(last_old) and len(last_new) < SearchIndex.FUZZY_MIN_LEN
+
+    def _narrow_source(self, key):
+        best = None
+        sources = list(self.recent.items())
+        if self.results_key is not None:
+            sources.append((self.results_key, self.results))
+        for old, ids in sources:
+            if self._narrows(old, key) and (best is None or len(ids) < len(best)):
+                best = ids
+        return best
+
+    def _remember(self, key, ids):
+        self.recent[key] = ids
+        self.recent.move_to_end(key)
+        while len(self.recent) > self.CACHE_SIZE:
+            self.recent.popitem(last=False)
+
+    def _show(self, key, ids):
+        self.results = ids
+        self.results_key = key
+        bump_version("search")
+
+    def _run(self, generation, query, key, within):
+        try:
+            ids = self.index.search(query, within)
+        except Exception as e:
+            print("Search failed:", e)
+            ids = []
+        self.done.put((generation, key, ids))
+
+    def poll(self):
+        if state_versions["library"] != self.library_version:
+            self.library_version = state_versions["library"]
+            self.invalidate()
+        while True:
+            try:
+                generation, key, ids = self.done.get_nowait()
+            except queue.Empty:
+                break
+            self.running = False
+            self._remember(key, ids)
+            if generation == self.generation:
+                self._show(key, ids)
+        if self.wanted is None:
+            return
+        query = self.wanted
+        key = tuple(SearchIndex.tokenize(query))
+        if not key:
+            ids = []
+        elif key in self.recent:
+            ids = self.recent[key]
+            self.recent.move_to_end(key)
+            self.cached += 1
+        else:
+            within = self._narrow_source(key)
+            if within is not None:
+                cost = len(within)
+            else:
+                cost = self.index.estimate(query, self.SYNC_COST)
+            if not self.running and cost <= self.SYNC_COST:
+                ids = self.index.search(query, within)
+                self.narrowed += within is not None
+            else:
+                if self.running or pygame.time.get_ticks() - self.typed_at < self.DEBOUNCE_MS:
+                    return
+                self.narrowed += within is not None
+                self.generation += 1
+                self.running = True
+                self.background += 1
+                self.wanted = None
+                self.pool.submit(self._run, self.generation, query, key, within)
+                return
+            self._remember(key, ids)
+        self.wanted = None
+        self.generation += 1
+        self._show(key, ids)
+
+    def stats(self):
+        return f"search: {self.narrowed} narrowed, {self.cached} from cache, {self.background} in background"
+
+
+def demo_library():
+    return [
+        {"title": "Drop audio files", "artist": "in /music folder", "length": 0.0, "file": None, "id": "demo_0"},
+    ]
+
+
+def bump_version(name):
+    state_versions[name] += 1
+
+
+def rebuild_track_index():
+    track_index.clear()
+    library_positions.clear()
+    for i, track in enumerate(music_library):
+        track_index[track["id"]] = track
+        library_positions[track["id"]] = i
+    bump_version("library")
+
+
+def get_track(track_id):
+    return track_index.get(track_id)
+
+
+def rename_track(old_id, new_id):
+    global current_index
+    track = track_index.pop(old_id, None)
+    if track:
+        existing = track_index.get(new_id)
+        if existing is not None and existing is not track:
+            music_library[:] = [t for t in music_library if t is not existing]
+            library_positions.pop(new_id, None)
+            search_index.remove(new_id)
+        track["file"] = new_id
+        track_index[new_id] = track
+        library_positions[new_id] = library_positions.pop(old_id)
+        search_index.remove(old_id)
+        search_index.add(track)
+    if current_index == old_id:
+        current_index = new_id
+    if old_id in play_queue:
+        play_queue[:] = [new_id if tid == old_id else tid for tid in play_queue]
+        bump_version("queue")
+    if old_id in play_history:
+        play_history[:] = [new_id if tid == old_id else tid for tid in play_history]
+        bump_version("history")
+        save_history()
+    playlists.rename_track(old_id, new_id)
+
+
+def apply_scan_results():
+    changed = False
+    for kind, data in library_scanner.poll():
+        if kind == "batch":
+            if music_library and music_library[0]["file"] is None:
+                music_library.clear()
+                rebuild_track_index()
+            for track in data:
+                track_index[track["id"]] = track
+                library_positions[track["id"]] = len(music_library)
+                music_library.append(track)
+                search_index.add(track)
+            library_scanner.unsorted = True
+        elif kind == "added":
+            if music_library and music_library[0]["file"] is None:
+                music_library.clear()
+            replaced = {t["id"] for t in data if t["id"] in track_index}
+            if replaced:
+                music_library[:] = [t for t in music_library if t["id"] not in replaced]
+            music_library.extend(data)
+            for track in data:
+                search_index.add(track)
+            changed = library_scanner.unsorted = True
+        elif kind == "removed":
+            gone = set(data)
+            music_library[:] = [t for t in music_library if t["id"] not in gone]
+            for track_id in gone:
+                search_index.remove(track_id)
+            changed = True
+        elif kind == "renamed":
+            for old_id, new_id in data:
+                rename_track(old_id, new_id)
+            changed = library_scanner.unsorted = True
+    if library_scanner.unsorted and (changed or not library_scanner.backlog):
+        music_library.sort(key=lambda x: x.title.lower())
+        library_scanner.unsorted = False
+        changed = True
+    elif library_scanner.unsorted:
+        now = pygame.time.get_ticks()
+        if now - library_scanner.refreshed_at >= LibraryScanner.REFRESH_MS:
+            library_scanner.refreshed_at = now
+            bump_version("library")
+    if not library_scanner.active and not music_library:
+        music_library.extend(demo_library())
+        changed = True
+    if changed:
+        rebuild_track_index()
+
+
+def apply_album_art():
+    for path in album_cache.poll():
+        list_compositor.refresh_track(path)
+
+
+def apply_length_probes():
+    global progress_max
+    for path, length in length_prober.poll():
+        track = get_track(path)
+        if track and length > 0:
+            track["length"] = length
+            if current_index == path:
+                progress_max = length
+            frame_regions.invalidate()
+            list_compositor.invalidate()
+
+
+library_scanner = LibraryScanner()
+length_prober = LengthProber()
+music_library = []
+track_index = {}
+library_positions = {}
+search_index = SearchIndex()
+search_engine = SearchEngine(search_index)
+state_versions = {"library": 0, "playlists": 0, "history": 0, "queue": 0, "search": 0}
+library_scanner.start(music_folder)
+
+
+class PlaylistStore:
+    COMPACT_AFTER = 500
+
+    def __init__(self, path, journal_path):
+        self.path = path
+        self.journal_path = journal_path
+        self.lists = {}
+        self.journal = None
+        self.records = 0
+
+    def load(self):
+        data = None
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print("Failed to load playlists:", e)
+        if not isinstance(data, dict):
+            data = {"Liked Songs": [], "My Playlist": [], "Chill": []}
+        self.lists = {name: dict.fromkeys(ids) for name, ids in data.items()}
+        try:
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            self._apply(json.loads(line))
+                        except (ValueError, TypeError, KeyError, IndexError):
+                            self.records = self.COMPACT_AFTER
+                            continue
+                        self.records += 1
+        except IOError as e:
+            print("Failed to read playlist journal:", e)
+        if self.records >= self.COMPACT_AFTER:
+            persistence.mark("playlists")
+
+    def _apply(self, record):
+        op = record[0]
+        if op == "add":
+            self.lists[record[1]][record[2]] = None
+        elif op == "remove":
+            self.lists[record[1]].pop(record[2], None)
+        elif op == "create":
+            self.lists.setdefault(record[1], {})
+        elif op == "delete":
+            self.lists.pop(record[1], None)
+        elif op == "replace":
+            for name, ids in self.lists.items():
+                if record[1] in ids:
+                    self.lists[name] = {record[2] if tid == record[1] else tid: None for tid in ids}
+
+    def _log(self, *record):
+        self._apply(record)
+        try:
+            if self.journal is None:
+                self.journal = open(self.journal_path, "a", encoding="utf-8")
+            self.journal.write(json.dumps(record) + "\n")
+            self.journal.flush()
+        except IOError as e:
+            print("Failed to update playlist journal:", e)
+        self.records += 1
+        bump_version("playlists")
+        if self.records >= self.COMPACT_AFTER:
+            persistence.mark("playlists")
+
+    def snapshot(self):
+        return {name: list(ids) for name, ids in self.lists.items()}
+
+    def compacted(self):
+        try:
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            open(self.journal_path, "w").close()
+        except IOError as e:
+            print("Failed to reset playlist journal:", e)
+        self.records = 0
+
+    def create(self, name):
+        if name not in self.lists:
+            self._log("create", name)
+
+    def delete(self, name):
+        if name in self.lists:
+            self._log("delete", name)
+
+    def add(self, name, song_id):
+        ids = self.lists.get(name)
+        if ids is None or song_id in ids:
+            return False
+        self._log("add", name, song_id)
+        return True
+
+    def remove(self, name, song_id):
+        ids = self.lists.get(name)
+        if ids is None or song_id not in ids:
+            return False
+        self._log("remove", name, song_id)
+        return True
+
+    def rename_track(self, old_id, new_id):
+        if any(old_id in ids for ids in self.lists.values()):
+            self._log("replace", old_id, new_id)
+
+    def stats(self):
+        total = sum(len(ids) for ids in self.lists.values())
+        return f"playlists: {len(self.lists)} lists, {total} entries, {self.records} journal records"
+
+    def __contains__(self, name):
+        return name in self.lists
+
+    def __getitem__(self, name):
+        return self.lists[name]
+
+    def __len__(self):
+        return len(self.lists)
+
+    def get(self, name, default=None):
+        return self.lists.get(name, default)
+
+    def keys(self):
+        return self.lists.keys()
+
+    def items(self):
+        return self.lists.items()
 
 
 def save_playlists():
-    try:
-        with open(PLAYLIST_FILE, "w", encoding="utf-8") as f:
-            json.dump(playlists, f, indent=2)
-    except IOError as e:
-        print("Failed to save playlists:", e)
+    persistence.mark("playlists")
 
 
-playlists = load_playlists()
+playlists = PlaylistStore(PLAYLIST_FILE, PLAYLIST_JOURNAL_FILE)
+persistence.register("playlists", PLAYLIST_FILE, playlists.snapshot, playlists.compacted)
+playlists.load()
 
 current_index = None
 is_playing = False
@@ -319,6 +1775,7 @@ playlist_popup_buttons = []
 show_create_playlist_popup = False
 new_playlist_name = ""
 show_shortcuts = False
+show_stats = False
 mini_player_mode = settings.get("mini_player", False)
 
 SIDEBAR_W = 260
@@ -331,50 +1788,311 @@ drag_start_pos = None
 drag_offset = 0
 
 
+class ThumbnailStore:
+    COMPACT_FRACTION = 0.25
+    COMPACT_MIN_BYTES = 1024 * 1024
+
+    def __init__(self, index_path, pack_path):
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pack = None
+        self.hits = 0
+        self.misses = 0
+        try:
+            self.conn = sqlite3.connect(index_path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            LibraryIndex.migrate(self.conn)
+            self.pack = open(pack_path, "a+b")
+            self._compact(pack_path)
+        except (sqlite3.Error, OSError) as e:
+            print("Failed to open album art cache:", e)
+            self.close()
+
+    def _compact(self, pack_path):
+        self.conn.execute("DELETE FROM art_paths WHERE path NOT IN (SELECT path FROM tracks)")
+        self.conn.execute("DELETE FROM art_images WHERE digest NOT IN "
+                          "(SELECT digest FROM art_paths WHERE digest IS NOT NULL)")
+        self.conn.commit()
+        rows = self.conn.execute("SELECT digest, size, offset, width, height FROM art_images ORDER BY offset").fetchall()
+        live = sum(width * height * 4 for _, _, _, width, height in rows)
+        self.pack.seek(0, 2)
+        total = self.pack.tell()
+        if not rows:
+            self.pack.truncate(0)
+            return
+        if total - live < max(self.COMPACT_MIN_BYTES, total * self.COMPACT_FRACTION):
+            return
+        moved = []
+        lost = []
+        tmp = pack_path + ".tmp"
+        with open(tmp, "wb") as out:
+            for digest, size, offset, width, height in rows:
+                self.pack.seek(offset)
+                data = self.pack.read(width * height * 4)
+                if len(data) != width * height * 4:
+                    lost.append((digest, size))
+                    continue
+                moved.append((out.tell(), digest, size))
+                out.write(data)
+            out.flush()
+            os.fsync(out.fileno())
+        self.pack.close()
+        self.pack = None
+        os.replace(tmp, pack_path)
+        self.conn.executemany("UPDATE art_images SET offset = ? WHERE digest = ? AND size = ?", moved)
+        self.conn.executemany("DELETE FROM art_images WHERE digest = ? AND size = ?", lost)
+        self.conn.commit()
+        self.pack = open(pack_path, "a+b")
+
+    def load_digest(self, path, mtime):
+        if not self.conn:
+            return False, None
+        with self.lock:
+            try:
+                row = self.conn.execute("SELECT mtime, digest FROM art_paths WHERE path = ?", (path,)).fetchone()
+            except sqlite3.Error as e:
+                print("Failed to read album art cache:", e)
+                return False, None
+        if row is None or row[0] != mtime:
+            return False, None
+        return True, row[1]
+
+    def save_digest(self, path, mtime, digest):
+        if not self.conn:
+            return
+        with self.lock:
+            try:
+                self.conn.execute("INSERT OR REPLACE INTO art_paths VALUES (?, ?, ?)", (path, mtime, digest))
+                self.conn.commit()
+            except sqlite3.Error as e:
+                print("Failed to update album art cache:", e)
+
+    def load(self, digest, size):
+        if not self.conn:
+            return None
+        with self.lock:
+            try:
+                row = self.conn.execute("SELECT offset, width, height FROM art_images WHERE digest = ? AND size = ?",
+                                        (digest, size)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                self.pack.seek(row[0])
+                data = self.pack.read(row[1] * row[2] * 4)
+                if len(data) != row[1] * row[2] * 4:
+                    self.misses += 1
+                    self.conn.execute("DELETE FROM art_images WHERE digest = ? AND size = ?", (digest, size))
+                    self.conn.commit()
+                    return None
+            except (sqlite3.Error, OSError) as e:
+                print("Failed to read album art cache:", e)
+                return None
+        self.hits += 1
+        return pygame.image.frombuffer(data, (row[1], row[2]), "RGBA")
+
+    def save(self, digest, size, surf):
+        if not self.conn:
+            return
+        data = pygame.image.tostring(surf, "RGBA")
+        with self.lock:
+            try:
+                if self.conn.execute("SELECT 1 FROM art_images WHERE digest = ? AND size = ?",
+                                     (digest, size)).fetchone():
+                    return
+                self.pack.seek(0, 2)
+                offset = self.pack.tell()
+                self.pack.write(data)
+                self.pack.flush()
+                width, height = surf.get_size()
+                self.conn.execute("INSERT INTO art_images VALUES (?, ?, ?, ?, ?)",
+                                  (digest, size, offset, width, height))
+                self.conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                print("Failed to update album art cache:", e)
+
+    def close(self):
+        with self.lock:
+            if self.pack:
+                try:
+                    self.pack.close()
+                except OSError:
+                    pass
+                self.pack = None
+            if self.conn:
+                try:
+                    self.conn.close()
+                except sqlite3.Error:
+                    pass
+                self.conn = None
+
+
+def scale_art(img, size):
+    try:
+        return pygame.transform.smoothscale(img, (size, size))
+    except ValueError:
+        return pygame.transform.scale(img, (size, size))
+
+
 class AlbumArtCache:
-    def __init__(self, max_items=64, thumb_size=64):
+    def __init__(self, max_bytes=4 * 1024 * 1024, sizes=(40, 64), workers=2, store=None):
         self.cache = OrderedDict()
-        self.max_items = max_items
-        self.thumb_size = thumb_size
-
-    def get(self, track_path):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.sizes = sizes
+        self.digests = {}
+        self.missing = set()
+        self.pending = {}
+        self.results = queue.Queue()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="album-art")
+        self.version = 0
+        self.cancelled = 0
+        self.evictions = 0
+        self.store = store
+
+    def get(self, track_path, size=None):
         if not track_path:
             return None
-        if track_path in self.cache:
-            surf = self.cache.pop(track_path)
-            self.cache[track_path] = surf
-            return surf
-        surf = self._load_art(track_path)
-        if surf:
-            self.cache[track_path] = surf
-            while len(self.cache) > self.max_items:
-                self.cache.popitem(last=False)
-        return surf
+        size = size or self.sizes[0]
+        digest = self.digests.get(track_path)
+        if digest is not None:
+            surf = self.cache.get((digest, size))
+            if surf is not None:
+                self.cache.move_to_end((digest, size))
+                return surf
+            larger = [s for s in self.sizes if s > size and (digest, s) in self.cache]
+            if larger:
+                surf = scale_art(self.cache[(digest, larger[0])], size)
+                self._put(digest, size, surf)
+                return surf
+        elif track_path in self.missing:
+            return None
+        if track_path not in self.pending:
+            self.pending[track_path] = self.pool.submit(self._load, track_path, size)
+        return None
 
-    def _load_art(self, path):
+    def _put(self, digest, size, surf):
+        key = (digest, size)
+        if key in self.cache:
+            self.bytes -= self._surface_bytes(self.cache.pop(key))
+        self.cache[key] = surf
+        self.bytes += self._surface_bytes(surf)
+        while self.bytes > self.max_bytes and len(self.cache) > 1:
+            _, old = self.cache.popitem(last=False)
+            self.bytes -= self._surface_bytes(old)
+            self.evictions += 1
+
+    @staticmethod
+    def _surface_bytes(surf):
+        w, h = surf.get_size()
+        return w * h * 4
+
+    def retain(self, paths):
+        for path, future in list(self.pending.items()):
+            if path not in paths and future.cancel():
+                del self.pending[path]
+                self.cancelled += 1
+
+    def poll(self):
+        arrived = []
+        while True:
+            try:
+                path, digest, images = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.pop(path, None)
+            if digest is None:
+                self.missing.add(path)
+                continue
+            self.digests[path] = digest
+            for size, img in images.items():
+                self._put(digest, size, img.convert_alpha())
+            arrived.append(path)
+        if arrived:
+            self.version += 1
+        return arrived
+
+    def stats(self):
+        images = len({digest for digest, _ in self.cache})
+        line = (f"album art: {images} images for {len(self.digests)} tracks, {self.bytes / 1024:.0f} KiB, "
+                f"{len(self.pending)} loading, {self.cancelled} cancelled, {self.evictions} evicted")
+        if self.store:
+            line += f", disk {self.store.hits} hits / {self.store.misses} misses"
+        return line
+
+    def _load(self, path, size):
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            self.results.put((path, None, None))
+            return
+        found, digest = self.store.load_digest(path, mtime) if self.store else (False, None)
+        data = None
+        if not found:
+            data = self._read_art(path)
+            digest = hashlib.sha1(data).hexdigest() if data else None
+            if self.store:
+                self.store.save_digest(path, mtime, digest)
+        if digest is None:
+            self.results.put((path, None, None))
+            return
+        images = {}
+        missing = []
+        for s in sorted(set(self.sizes) | {size}):
+            if (digest, s) in self.cache:
+                continue
+            img = self.store.load(digest, s) if self.store else None
+            if img is None:
+                missing.append(s)
+            else:
+                images[s] = img
+        if missing:
+            if data is None:
+                data = self._read_art(path)
+            full = self._decode(data)
+            if full is None:
+                self.results.put((path, None, None))
+                return
+            for s in missing:
+                images[s] = scale_art(full, s)
+                if self.store:
+                    self.store.save(digest, s, images[s])
+        self.results.put((path, digest, images))
+
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        if self.store:
+            self.store.close()
+
+    def _read_art(self, path):
         try:
             from mutagen.mp3 import MP3
             from mutagen.id3 import ID3, APIC
-            from io import BytesIO
             audio = MP3(path, ID3=ID3)
             if audio.tags:
                 for tag in audio.tags.values():
                     try:
                         if tag.FrameID == 'APIC' or getattr(tag, '__class__', None).__name__ == 'APIC':
-                            data = getattr(tag, 'data', None) or getattr(tag, 'data', None)
+                            data = getattr(tag, 'data', None)
                             if data:
-                                bytes_io = BytesIO(data)
-                                img = pygame.image.load(bytes_io).convert_alpha()
-                                img = pygame.transform.smoothscale(img, (self.thumb_size, self.thumb_size))
-                                return img
+                                return data
                     except Exception:
                         continue
         except (ImportError, Exception):
             pass
         return None
 
+    def _decode(self, data):
+        if not data:
+            return None
+        try:
+            from io import BytesIO
+            return pygame.image.load(BytesIO(data))
+        except (pygame.error, Exception):
+            return None
+
 
-album_cache = AlbumArtCache(max_items=96, thumb_size=40)
+album_cache = AlbumArtCache(store=ThumbnailStore(LIBRARY_INDEX_FILE, ALBUM_ART_PACK_FILE))
 
 play_queue = []
 
@@ -386,10 +2104,12 @@ def queue_add(track_id, play_next=False):
         play_queue.insert(0, track_id)
     else:
         play_queue.append(track_id)
+    bump_version("queue")
 
 
 def queue_pop_next():
     if play_queue:
+        bump_version("queue")
         return play_queue.pop(0)
     return None
 
@@ -397,12 +2117,22 @@ def queue_pop_next():
 def queue_remove_at(index):
     if 0 <= index < len(play_queue):
         play_queue.pop(index)
+        bump_version("queue")
+
+
+def queue_remove(track_id):
+    try:
+        play_queue.remove(track_id)
+    except ValueError:
+        return
+    bump_version("queue")
 
 
 def queue_move(from_idx, to_idx):
     if 0 <= from_idx < len(play_queue) and 0 <= to_idx < len(play_queue):
         item = play_queue.pop(from_idx)
         play_queue.insert(to_idx, item)
+        bump_version("queue")
 
 
 class Button:
@@ -432,10 +2162,10 @@ class Button:
         else:
             color = self.color
 
-        pygame.draw.rect(surf, color, self.rect, border_radius=self.radius)
+        draw.rect(surf, color, self.rect, border_radius=self.radius)
 
         if self.text:
-            text_surf = self.font.render(self.text, True, self.text_color)
+            text_surf = render_text(self.text, self.font, self.text_color)
             text_x = self.rect.centerx - text_surf.get_width() // 2
             text_y = self.rect.centery - text_surf.get_height() // 2
             surf.blit(text_surf, (text_x, text_y))
@@ -460,15 +2190,15 @@ class NavButton:
         color = GREEN if self.active else (BTN_H if self.hovered else SIDEBAR)
 
         if color != SIDEBAR:
-            pygame.draw.rect(surf, color, self.rect, border_radius=12)
+            draw.rect(surf, color, self.rect, border_radius=12)
 
         text_color = WHITE if self.active or self.hovered else GRAY
-        text_surf = F_BOLD.render(self.text, True, text_color)
+        text_surf = render_text(self.text, F_BOLD, text_color)
         surf.blit(text_surf, (self.rect.x + 16, self.rect.centery - text_surf.get_height() // 2))
 
         if self.active:
             active_bar = pygame.Rect(self.rect.x + 2, self.rect.y + 4, 3, self.rect.height - 8)
-            pygame.draw.rect(surf, GREEN, active_bar, border_radius=2)
+            draw.rect(surf, GREEN, active_bar, border_radius=2)
 
     def handle_click(self, pos):
         return self.rect.collidepoint(pos)
@@ -488,18 +2218,18 @@ class PlaylistButton:
 
     def draw(self, surf):
         if self.hovered or self.active:
-            pygame.draw.rect(surf, BTN_H if self.hovered else BTN, self.rect, border_radius=12)
+            draw.rect(surf, BTN_H if self.hovered else BTN, self.rect, border_radius=12)
 
         col = GREEN if self.active else (WHITE if self.hovered else GRAY_L)
-        title = F_BOLD.render(self.name, True, col)
+        title = render_text(self.name, F_BOLD, col)
         surf.blit(title, (self.rect.x + 16, self.rect.y + 12))
 
-        cnt = F_SMALL.render(f"{self.count} songs", True, GRAY_D)
+        cnt = render_text(f"{self.count} songs", F_SMALL, GRAY_D)
         surf.blit(cnt, (self.rect.x + 16, self.rect.y + 32))
 
         if self.active:
             active_bar = pygame.Rect(self.rect.x + 2, self.rect.y + 4, 3, self.rect.height - 8)
-            pygame.draw.rect(surf, GREEN, active_bar, border_radius=2)
+            draw.rect(surf, GREEN, active_bar, border_radius=2)
 
     def handle_click(self, pos):
         return self.rect.collidepoint(pos)
@@ -508,102 +2238,121 @@ class PlaylistButton:
 class TrackRow:
     def __init__(self, rect, track, track_id, positions, track_index):
         self.rect = pygame.Rect(rect)
-        self.track = track
-        self.track_id = track_id
+        self.track = None
+        self.track_id = None
+        self.track_index = None
         self.positions = positions
-        self.track_index = track_index
         self.hovered = False
         self.is_current = False
+        self.playlist_mode = None
         self.add_button = None
-        self.thumb_surf = None
-        self.title_surf = None
-        self.artist_surf = None
-        self.duration_surf = None
-        self.number_surf = None
+        self.queue_button = None
+        self.row_buttons = None
+        self.bind(rect, track, track_id, positions, track_index)
+
+    def bind(self, rect, track, track_id, positions, track_index):
+        self.rect.update(rect)
+        self.positions = positions
+        if track is not self.track or track_id != self.track_id:
+            self.track = track
+            self.track_id = track_id
+            self.thumb_surf = None
+            self.title_surf = None
+            self.current_title_surf = None
+            self.artist_surf = None
+            self.duration_surf = None
+            self.length = None
+        if track_index != self.track_index:
+            self.track_index = track_index
+            self.number_surf = None
+        if self.length != self.track.get("length"):
+            self.length = self.track.get("length")
+            self.duration_surf = None
 
     def update(self, mouse_pos, current_idx):
         self.hovered = self.rect.collidepoint(mouse_pos)
-        self.is_current = self.track_id == current_idx
+        is_current = self.track_id == current_idx
+        if is_current != self.is_current:
+            self.is_current = is_current
+            self.number_surf = None
 
         if self.hovered:
-            add_rect = pygame.Rect(self.rect.right - 210, self.rect.y + 14, 100, 28)
-            extra_rect = pygame.Rect(self.rect.right - 102, self.rect.y + 14, 80, 28)
-            if current_view == "playlist" and selected_playlist:
-                self.add_button = Button(add_rect, (150, 50, 50), (180, 60, 60), "Remove", F_SMALL, WHITE, 16)
-                self.queue_button = Button(extra_rect, BTN, BTN_H, "Play Next", F_SMALL, WHITE, 16)
-                self.queue_button.update(mouse_pos)
-            else:
-                self.add_button = Button(add_rect, BTN, BTN_H, "Add", F_SMALL, WHITE, 16)
-                self.queue_button = Button(extra_rect, BTN, BTN_H, "Play Next", F_SMALL, WHITE, 16)
+            playlist_mode = current_view == "playlist" and bool(selected_playlist)
+            if self.row_buttons is None or playlist_mode != self.playlist_mode:
+                self.playlist_mode = playlist_mode
+                if playlist_mode:
+                    add_button = Button((0, 0, 100, 28), (150, 50, 50), (180, 60, 60), "Remove", F_SMALL, WHITE, 16)
+                else:
+                    add_button = Button((0, 0, 100, 28), BTN, BTN_H, "Add", F_SMALL, WHITE, 16)
+                self.row_buttons = (add_button, Button((0, 0, 80, 28), BTN, BTN_H, "Play Next", F_SMALL, WHITE, 16))
+            self.add_button, self.queue_button = self.row_buttons
+            self.add_button.rect.topleft = (self.rect.right - 210, self.rect.y + 14)
+            self.queue_button.rect.topleft = (self.rect.right - 102, self.rect.y + 14)
             self.add_button.update(mouse_pos)
+            self.queue_button.update(mouse_pos)
         else:
             self.add_button = None
             self.queue_button = None
 
     def draw(self, surf):
         if self.hovered:
-            pygame.draw.rect(surf, HOVER, self.rect, border_radius=12)
+            draw.rect(surf, HOVER, self.rect, border_radius=12)
 
         thumb_size = 40
-        thumb_x = self.positions[0] - 50
-        thumb_rect = pygame.Rect(thumb_x, self.rect.centery - thumb_size // 2, thumb_size, thumb_size)
+        thumb_pos = (self.positions[0] - 50, self.rect.centery - thumb_size // 2)
 
         if not self.thumb_surf:
-            self.thumb_surf = album_cache.get(self.track.get("file"))
-            if not self.thumb_surf:
-                surf_temp = pygame.Surface((thumb_size, thumb_size))
-                for i in range(thumb_size):
-                    ratio = i / thumb_size
-                    color = (int(60 + ratio * 80), int(40 + ratio * 100), int(80 + ratio * 60))
-                    pygame.draw.rect(surf_temp, color, (0, i, thumb_size, 1))
-                pygame.draw.circle(surf_temp, (220, 220, 220), (thumb_size // 2 - 4, thumb_size // 2 + 6), 4, 2)
-                pygame.draw.circle(surf_temp, (220, 220, 220), (thumb_size // 2 + 6, thumb_size // 2 + 4), 4, 2)
-                pygame.draw.line(surf_temp, (220, 220, 220), (thumb_size // 2 + 2, thumb_size // 2 + 4),
-                                 (thumb_size // 2 + 2, thumb_size // 2 - 8), 2)
-                self.thumb_surf = surf_temp
-
-        surf.blit(self.thumb_surf, thumb_rect)
+            self.thumb_surf = album_cache.get(self.track.get("file"), thumb_size)
+        surf.blit(self.thumb_surf or decorations.get(build_thumb_placeholder, thumb_size), thumb_pos)
 
         nc = GREEN if self.is_current else GRAY_D
         if self.is_current and is_playing:
-            x = self.positions[0]
-            y = self.rect.centery
-            bar_width = 3
-            bar_spacing = 2
-            time_factor = pygame.time.get_ticks() / 100
-            for i in range(3):
-                height = 8 + 6 * abs(((time_factor + i * 30) % 100) / 50 - 1)
-                pygame.draw.rect(surf, GREEN, (x + i * (bar_width + bar_spacing), y - height / 2, bar_width, height),
-                                 border_radius=1)
+            self.draw_indicator(surf)
         else:
             if not self.number_surf:
                 nt = str(self.track_index + 1)
-                self.number_surf = F_SMALL.render(nt, True, nc)
+                self.number_surf = render_text(nt, F_SMALL, nc)
             surf.blit(self.number_surf, (self.positions[0], self.rect.centery - self.number_surf.get_height() // 2))
 
         if not self.title_surf:
-            self.title_surf = F_BODY.render(self.track["title"][:35], True, WHITE)
+            self.title_surf = render_text(self.track["title"][:35], F_BODY, WHITE)
         if self.is_current:
-            title_display = F_BODY.render(self.track["title"][:35], True, GREEN)
+            if not self.current_title_surf:
+                self.current_title_surf = render_text(self.track["title"][:35], F_BODY, GREEN)
+            title_display = self.current_title_surf
         else:
             title_display = self.title_surf
         surf.blit(title_display, (self.positions[1], self.rect.centery - title_display.get_height() // 2))
 
         if not self.artist_surf:
-            self.artist_surf = F_BODY.render(self.track["artist"][:30], True, GRAY)
+            self.artist_surf = render_text(self.track["artist"][:30], F_BODY, GRAY)
         surf.blit(self.artist_surf, (self.positions[2], self.rect.centery - self.artist_surf.get_height() // 2))
 
         if not self.duration_surf:
-            self.duration_surf = F_BODY.render(self.track["duration"], True, GRAY)
+            self.duration_surf = render_text(format_duration(self.track.get("length")), F_BODY, GRAY)
         surf.blit(self.duration_surf, (self.positions[3], self.rect.centery - self.duration_surf.get_height() // 2))
 
         if self.add_button:
             self.add_button.draw(surf)
-        if getattr(self, "queue_button", None):
+        if self.queue_button:
             self.queue_button.draw(surf)
 
+    def indicator_rect(self):
+        return pygame.Rect(self.positions[0], self.rect.centery - 7, 15, 15)
+
+    def draw_indicator(self, surf):
+        x = self.positions[0]
+        y = self.rect.centery
+        bar_width = 3
+        bar_spacing = 2
+        time_factor = pygame.time.get_ticks() / 100
+        for i in range(3):
+            height = 8 + 6 * abs(((time_factor + i * 30) % 100) / 50 - 1)
+            draw.rect(surf, GREEN, (x + i * (bar_width + bar_spacing), y - height / 2, bar_width, height),
+                      border_radius=1)
+
     def handle_click(self, pos):
-        if getattr(self, "queue_button", None) and self.queue_button.handle_click(pos):
+        if self.queue_button and self.queue_button.handle_click(pos):
             return "queue_next"
         if self.add_button and self.add_button.handle_click(pos):
             if current_view == "playlist" and selected_playlist:
@@ -615,6 +2364,136 @@ class TrackRow:
         return None
 
 
+class TrackRowPool:
+    def __init__(self):
+        self.active = {}
+        self.previous = {}
+        self.free = []
+        self.created = 0
+
+    def begin(self):
+        self.previous, self.active = self.active, self.previous
+        self.active.clear()
+
+    def acquire(self, rect, track, track_id, positions, track_index):
+        row = self.previous.pop(track_id, None)
+        if row is not None:
+            row.bind(rect, track, track_id, positions, track_index)
+        elif self.free:
+            row = self.free.pop()
+            row.bind(rect, track, track_id, positions, track_index)
+        else:
+            row = TrackRow(rect, track, track_id, positions, track_index)
+            self.created += 1
+        self.active[track_id] = row
+        return row
+
+    def end(self):
+        self.free.extend(self.previous.values())
+        self.previous.clear()
+
+    def clear(self):
+        self.active.clear()
+        self.previous.clear()
+        self.free = []
+
+    def stats(self):
+        return f"row pool: {len(self.active)} bound, {len(self.free)} free, {self.created} created"
+
+
+track_row_pool = TrackRowPool()
+
+
+class ListCompositor:
+    MARGIN_ROWS = 4
+
+    def __init__(self):
+        self.strip = None
+        self.key = None
+        self.top = 0
+        self.current = None
+        self.pool = TrackRowPool()
+        self.rows_rendered = 0
+        self.full_renders = 0
+        self.stale = set()
+
+    def invalidate(self):
+        self.key = None
+
+    def refresh_track(self, track_id):
+        self.stale.add(track_id)
+
+    def strip_range(self, lib):
+        if self.strip is None:
+            return range(0)
+        first = self.top // TRACK_H
+        return range(first, min(len(lib), (self.top + self.strip.get_height()) // TRACK_H + 1))
+
+    def _render(self, lib, positions, y0, y1):
+        y0 = max(y0, self.top)
+        y1 = min(y1, self.top + self.strip.get_height())
+        if y1 <= y0:
+            return
+        band = pygame.Rect(0, y0 - self.top, self.strip.get_width(), y1 - y0)
+        self.strip.fill(BG, band)
+        self.strip.set_clip(band)
+        x = SIDEBAR_W + 32
+        w = WIDTH - SIDEBAR_W - 64
+        self.pool.begin()
+        for i in range(y0 // TRACK_H, min(len(lib), (y1 - 1) // TRACK_H + 1)):
+            track = lib[i]
+            row = self.pool.acquire((x, i * TRACK_H - self.top, w, TRACK_H - 4), track, track["id"], positions, i)
+            row.update((-1, -1), current_index)
+            row.draw(self.strip)
+            self.rows_rendered += 1
+        self.pool.end()
+        self.strip.set_clip(None)
+
+    def draw(self, surf, lib, positions, area, top):
+        margin = self.MARGIN_ROWS * TRACK_H
+        strip_h = area.height + 2 * margin
+        if self.strip is None or self.strip.get_size() != (WIDTH, strip_h):
+            self.strip = pygame.Surface((WIDTH, strip_h)).convert()
+            self.key = None
+        key = (view_model.key, tuple(positions), DPI_SCALE)
+        if key != self.key:
+            self.key = key
+            self.top = max(0, top - margin)
+            self.current = (current_index, is_playing)
+            self.full_renders += 1
+            self._render(lib, positions, self.top, self.top + strip_h)
+        elif top < self.top or top + area.height > self.top + strip_h:
+            new_top = max(0, top - margin)
+            dy = new_top - self.top
+            old_top = self.top
+            self.top = new_top
+            if abs(dy) >= strip_h:
+                self.full_renders += 1
+                self._render(lib, positions, new_top, new_top + strip_h)
+            else:
+                self.strip.scroll(0, -dy)
+                if dy > 0:
+                    self._render(lib, positions, old_top + strip_h, new_top + strip_h)
+                else:
+                    self._render(lib, positions, new_top, old_top)
+        current = (current_index, is_playing)
+        if current != self.current:
+            self.stale.update((self.current[0], current_index))
+            self.current = current
+        for tid in self.stale:
+            i = view_model.positions.get(tid)
+            if i is not None:
+                self._render(lib, positions, i * TRACK_H, (i + 1) * TRACK_H)
+        self.stale.clear()
+        surf.blit(self.strip, area.topleft, (area.x, top - self.top, area.width, area.height))
+
+    def stats(self):
+        return f"list strip: {self.rows_rendered} rows rendered, {self.full_renders} full renders"
+
+
+list_compositor = ListCompositor()
+
+
 class SearchBox:
     def __init__(self, rect):
         self.rect = pygame.Rect(rect)
@@ -627,20 +2506,20 @@ class SearchBox:
 
     def draw(self, surf, query):
         bg = BTN_H if self.active or self.hovered else BTN
-        pygame.draw.rect(surf, bg, self.rect, border_radius=24)
+        draw.rect(surf, bg, self.rect, border_radius=24)
 
         icon_x, icon_y = self.rect.x + 20, self.rect.centery
-        pygame.draw.circle(surf, GRAY_D, (icon_x, icon_y - 1), 6, 2)
-        pygame.draw.line(surf, GRAY_D, (icon_x + 4, icon_y + 3), (icon_x + 7, icon_y + 6), 2)
+        draw.circle(surf, GRAY_D, (icon_x, icon_y - 1), 6, 2)
+        draw.line(surf, GRAY_D, (icon_x + 4, icon_y + 3), (icon_x + 7, icon_y + 6), 2)
 
         txt = query if query else "What do you want to listen to?"
         col = WHITE if query else GRAY_D
-        t = F_BODY.render(txt[:50], True, col)
+        t = render_text(txt[:50], F_BODY, col)
         surf.blit(t, (self.rect.x + 40, self.rect.centery - t.get_height() // 2))
 
         if self.active and pygame.time.get_ticks() % 1000 < 500:
             crx = self.rect.x + 40 + t.get_width() + 3
-            pygame.draw.line(surf, WHITE, (crx, self.rect.y + 12), (crx, self.rect.y + 28), 2)
+            draw.line(surf, WHITE, (crx, self.rect.y + 12), (crx, self.rect.y + 28), 2)
 
     def handle_click(self, pos):
         return self.rect.collidepoint(pos)
@@ -665,32 +2544,32 @@ class CircleButton:
         if self.icon == "play":
             points = [(self.center[0] - 6, self.center[1] - 8), (self.center[0] - 6, self.center[1] + 8),
                       (self.center[0] + 8, self.center[1])]
-            pygame.draw.polygon(surf, color, points)
+            draw.polygon(surf, color, points)
         elif self.icon == "pause":
-            pygame.draw.rect(surf, color, (self.center[0] - 6, self.center[1] - 7, 4, 14), border_radius=1)
-            pygame.draw.rect(surf, color, (self.center[0] + 2, self.center[1] - 7, 4, 14), border_radius=1)
+            draw.rect(surf, color, (self.center[0] - 6, self.center[1] - 7, 4, 14), border_radius=1)
+            draw.rect(surf, color, (self.center[0] + 2, self.center[1] - 7, 4, 14), border_radius=1)
         elif self.icon == "prev" or self.icon == "next":
             if self.icon == "prev":
-                pygame.draw.rect(surf, color, (self.center[0] - 8, self.center[1] - 6, 2, 12), border_radius=1)
+                draw.rect(surf, color, (self.center[0] - 8, self.center[1] - 6, 2, 12), border_radius=1)
                 points = [(self.center[0] + 6, self.center[1] - 6), (self.center[0] + 6, self.center[1] + 6),
                           (self.center[0] - 3, self.center[1])]
             else:
-                pygame.draw.rect(surf, color, (self.center[0] + 6, self.center[1] - 6, 2, 12), border_radius=1)
+                draw.rect(surf, color, (self.center[0] + 6, self.center[1] - 6, 2, 12), border_radius=1)
                 points = [(self.center[0] - 6, self.center[1] - 6), (self.center[0] - 6, self.center[1] + 6),
                           (self.center[0] + 3, self.center[1])]
-            pygame.draw.polygon(surf, color, points)
+            draw.polygon(surf, color, points)
         elif self.icon == "shuffle":
-            pygame.draw.line(surf, color, (self.center[0] - 6, self.center[1] - 4),
-                             (self.center[0] + 6, self.center[1] + 4), 2)
-            pygame.draw.line(surf, color, (self.center[0] - 6, self.center[1] + 4),
-                             (self.center[0] + 6, self.center[1] - 4), 2)
+            draw.line(surf, color, (self.center[0] - 6, self.center[1] - 4),
+                      (self.center[0] + 6, self.center[1] + 4), 2)
+            draw.line(surf, color, (self.center[0] - 6, self.center[1] + 4),
+                      (self.center[0] + 6, self.center[1] - 4), 2)
         elif self.icon == "repeat":
-            pygame.draw.arc(surf, color, (self.center[0] - 6, self.center[1] - 6, 12, 12), 0.5, 5.5, 2)
-            pygame.draw.polygon(surf, color,
-                                [(self.center[0] + 6, self.center[1] - 6), (self.center[0] + 6, self.center[1] - 2),
-                                 (self.center[0] + 9, self.center[1] - 6)])
+            draw.arc(surf, color, (self.center[0] - 6, self.center[1] - 6, 12, 12), 0.5, 5.5, 2)
+            draw.polygon(surf, color,
+                         [(self.center[0] + 6, self.center[1] - 6), (self.center[0] + 6, self.center[1] - 2),
+                          (self.center[0] + 9, self.center[1] - 6)])
             if repeat_mode == REPEAT_ONE:
-                one_surf = F_TINY.render("1", True, color)
+                one_surf = render_text("1", F_TINY, color)
                 surf.blit(one_surf,
                           (self.center[0] - one_surf.get_width() // 2, self.center[1] - one_surf.get_height() // 2))
 
@@ -715,22 +2594,22 @@ class Slider:
     def draw(self, surf):
         bar_height = 4
         bar_rect = pygame.Rect(self.rect.x, self.rect.centery - bar_height // 2, self.rect.width, bar_height)
-        pygame.draw.rect(surf, BTN, bar_rect, border_radius=2)
+        draw.rect(surf, BTN, bar_rect, border_radius=2)
 
         fill_width = int(self.rect.width * self.value)
         if fill_width > 0:
             fill_rect = pygame.Rect(self.rect.x, self.rect.centery - bar_height // 2, fill_width, bar_height)
-            pygame.draw.rect(surf, GREEN, fill_rect, border_radius=2)
+            draw.rect(surf, GREEN, fill_rect, border_radius=2)
 
         handle_x = self.rect.x + fill_width
         if self.hovered or self.dragging:
             glow_surf = pygame.Surface((20, 20), pygame.SRCALPHA)
-            pygame.draw.circle(glow_surf, (30, 215, 96, 30), (10, 10), 10)
+            draw.circle(glow_surf, (30, 215, 96, 30), (10, 10), 10)
             surf.blit(glow_surf, (handle_x - 10, self.rect.centery - 10))
-            pygame.draw.circle(surf, WHITE, (handle_x, self.rect.centery), 6)
-            pygame.draw.circle(surf, GREEN, (handle_x, self.rect.centery), 4)
+            draw.circle(surf, WHITE, (handle_x, self.rect.centery), 6)
+            draw.circle(surf, GREEN, (handle_x, self.rect.centery), 4)
         else:
-            pygame.draw.circle(surf, WHITE, (handle_x, self.rect.centery), 5)
+            draw.circle(surf, WHITE, (handle_x, self.rect.centery), 5)
 
     def handle_click(self, pos):
         return self.rect.collidepoint(pos)
@@ -739,31 +2618,49 @@ class Slider:
         return max(0.0, min(1.0, (x - self.rect.x) / self.rect.width))
 
 
-def render_text(text, font_obj, color, antialias=True):
-    cache_key = (text, font_obj, color)
-    if not hasattr(render_text, 'cache'):
-        render_text.cache = {}
-    if cache_key not in render_text.cache:
-        render_text.cache[cache_key] = font_obj.render(text, True, color)
-    return render_text.cache[cache_key]
+class ViewModel:
+    def __init__(self):
+        self.key = None
+        self.tracks = []
+        self.positions = {}
+
+    def get(self):
+        key = (current_view, state_versions["search"], selected_playlist, state_versions["library"],
+               state_versions["playlists"], state_versions["history"])
+        if key != self.key:
+            self.tracks = build_library_view()
+            if self.tracks is music_library:
+                self.positions = library_positions
+            else:
+                self.positions = {t["id"]: i for i, t in enumerate(self.tracks)}
+            self.key = key
+        return self.tracks
+
+
+view_model = ViewModel()
 
 
 def get_library():
+    return view_model.get()
+
+
+def build_library_view():
     if current_view == "search" and search_query:
-        return [t for t in music_library if
-                search_query.lower() in t["title"].lower() or search_query.lower() in t["artist"].lower()]
+        return [track_index[t] for t in search_engine.results if t in track_index]
     elif current_view == "playlist" and selected_playlist:
         result = []
         for song_id in playlists.get(selected_playlist, []):
-            track = next((t for t in music_library if t["id"] == song_id), None)
+            track = track_index.get(song_id)
             if track:
                 result.append(track)
         return result
     elif current_view == "history":
         result = []
+        seen = set()
         for song_id in reversed(play_history[-50:]):
-            track = next((t for t in music_library if t["id"] == song_id), None)
-            if track and track not in result:
+            track = track_index.get(song_id)
+            if track and song_id not in seen:
+                seen.add(song_id)
                 result.append(track)
         return result
     return music_library
@@ -772,18 +2669,13 @@ def get_library():
 def add_to_playlist(song_id, pname):
     if not pname:
         return
-    if pname in playlists:
-        if song_id not in playlists[pname]:
-            playlists[pname].append(song_id)
-            save_playlists()
+    playlists.add(pname, song_id)
 
 
 def remove_from_playlist(song_id, pname):
     if not pname:
         return
-    if pname in playlists and song_id in playlists[pname]:
-        playlists[pname].remove(song_id)
-        save_playlists()
+    playlists.remove(pname, song_id)
 
 
 playlist_context_menu = {"visible": False, "playlist": None, "pos": (0, 0), "rects": {}}
@@ -804,9 +2696,9 @@ def draw_playlist_context_menu(surf, mouse_pos):
     shadow = rect.copy();
     shadow.x += 4;
     shadow.y += 4
-    pygame.draw.rect(surf, (0, 0, 0), shadow, border_radius=12)
-    pygame.draw.rect(surf, CARD, rect, border_radius=12)
-    title = F_SUB.render(playlist_context_menu["playlist"], True, WHITE)
+    draw.rect(surf, (0, 0, 0), shadow, border_radius=12)
+    draw.rect(surf, CARD, rect, border_radius=12)
+    title = render_text(playlist_context_menu["playlist"], F_SUB, WHITE)
     surf.blit(title, (rect.x + 12, rect.y + 8))
     opt1 = pygame.Rect(rect.x + 8, rect.y + 34, rect.width - 16, 20)
     opt2 = pygame.Rect(rect.x + 8, rect.y + 56, rect.width - 16, 20)
@@ -814,9 +2706,9 @@ def draw_playlist_context_menu(surf, mouse_pos):
     mp = mouse_pos
     for r in (opt1, opt2):
         if r.collidepoint(mp):
-            pygame.draw.rect(surf, BTN_H, r, border_radius=8)
-    otext = F_BODY.render("Open Playlist", True, WHITE)
-    dtext = F_BODY.render("Delete Playlist", True, WHITE)
+            draw.rect(surf, BTN_H, r, border_radius=8)
+    otext = render_text("Open Playlist", F_BODY, WHITE)
+    dtext = render_text("Delete Playlist", F_BODY, WHITE)
     surf.blit(otext, (opt1.x + 8, opt1.y))
     surf.blit(dtext, (opt2.x + 8, opt2.y))
 
@@ -836,11 +2728,11 @@ def draw_confirm_delete(surf, mouse_pos):
     shadow = popup_rect.copy();
     shadow.x += 4;
     shadow.y += 4
-    pygame.draw.rect(surf, (0, 0, 0), shadow, border_radius=12)
-    pygame.draw.rect(surf, CARD, popup_rect, border_radius=12)
-    title = F_HEAD.render("Delete Playlist?", True, WHITE)
+    draw.rect(surf, (0, 0, 0), shadow, border_radius=12)
+    draw.rect(surf, CARD, popup_rect, border_radius=12)
+    title = render_text("Delete Playlist?", F_HEAD, WHITE)
     surf.blit(title, (popup_x + 24, popup_y + 16))
-    txt = F_BODY.render(f"Are you sure you want to delete '{confirm_delete['playlist']}'?", True, GRAY)
+    txt = render_text(f"Are you sure you want to delete '{confirm_delete['playlist']}'?", F_BODY, GRAY)
     surf.blit(txt, (popup_x + 24, popup_y + 72))
     yes_rect = pygame.Rect(popup_x + popup_w - 240, popup_y + popup_h - 60, 96, 36)
     no_rect = pygame.Rect(popup_x + popup_w - 120, popup_y + popup_h - 60, 96, 36)
@@ -848,10 +2740,10 @@ def draw_confirm_delete(surf, mouse_pos):
     confirm_delete["no_rect"] = no_rect
     yes_hover = yes_rect.collidepoint(mouse_pos)
     no_hover = no_rect.collidepoint(mouse_pos)
-    pygame.draw.rect(surf, GREEN_H if yes_hover else GREEN, yes_rect, border_radius=18)
-    pygame.draw.rect(surf, BTN_H if no_hover else BTN, no_rect, border_radius=18)
-    ytxt = F_BOLD.render("Yes, delete", True, WHITE)
-    ntxt = F_BOLD.render("Cancel", True, WHITE)
+    draw.rect(surf, GREEN_H if yes_hover else GREEN, yes_rect, border_radius=18)
+    draw.rect(surf, BTN_H if no_hover else BTN, no_rect, border_radius=18)
+    ytxt = render_text("Yes, delete", F_BOLD, WHITE)
+    ntxt = render_text("Cancel", F_BOLD, WHITE)
     surf.blit(ytxt, (yes_rect.centerx - ytxt.get_width() // 2, yes_rect.centery - ytxt.get_height() // 2))
     surf.blit(ntxt, (no_rect.centerx - ntxt.get_width() // 2, no_rect.centery - ntxt.get_height() // 2))
 
@@ -863,7 +2755,7 @@ def draw_shortcuts(surf):
     surf.blit(overlay, (0, 0))
 
     popup_w = 500
-    popup_h = 450
+    popup_h = 490
     popup_x = WIDTH // 2 - popup_w // 2
     popup_y = HEIGHT // 2 - popup_h // 2
     popup_rect = pygame.Rect(popup_x, popup_y, popup_w, popup_h)
@@ -871,10 +2763,10 @@ def draw_shortcuts(surf):
     shadow = popup_rect.copy()
     shadow.x += 4
     shadow.y += 4
-    pygame.draw.rect(surf, (0, 0, 0), shadow, border_radius=12)
-    pygame.draw.rect(surf, CARD, popup_rect, border_radius=12)
+    draw.rect(surf, (0, 0, 0), shadow, border_radius=12)
+    draw.rect(surf, CARD, popup_rect, border_radius=12)
 
-    title = F_HEAD.render("Keyboard Shortcuts", True, WHITE)
+    title = render_text("Keyboard Shortcuts", F_HEAD, WHITE)
     surf.blit(title, (popup_x + 24, popup_y + 20))
 
     shortcuts = [
@@ -885,6 +2777,7 @@ def draw_shortcuts(surf):
         ("R", "Cycle Repeat Mode"),
         ("M", "Toggle Mini Player"),
         ("K", "Show Shortcuts"),
+        ("F3", "Toggle Stats Overlay"),
         ("/", "Focus Search"),
         ("Esc", "Close Popups/Quit")
     ]
@@ -892,22 +2785,55 @@ def draw_shortcuts(surf):
     y = popup_y + 80
     for key, action in shortcuts:
         key_rect = pygame.Rect(popup_x + 30, y, 180, 32)
-        pygame.draw.rect(surf, BTN, key_rect, border_radius=8)
-        key_text = F_BODY.render(key, True, WHITE)
+        draw.rect(surf, BTN, key_rect, border_radius=8)
+        key_text = render_text(key, F_BODY, WHITE)
         surf.blit(key_text, (key_rect.x + 12, key_rect.centery - key_text.get_height() // 2))
 
-        action_text = F_BODY.render(action, True, GRAY_L)
+        action_text = render_text(action, F_BODY, GRAY_L)
         surf.blit(action_text, (popup_x + 230, y + 8))
 
         y += 40
 
-    close_text = F_SMALL.render("Press K or Esc to close", True, GRAY)
+    close_text = render_text("Press K or Esc to close", F_SMALL, GRAY)
     surf.blit(close_text, (popup_x + popup_w // 2 - close_text.get_width() // 2, popup_y + popup_h - 30))
 
 
+def stats_lines():
+    return [
+        f"fps: {clock.get_fps():.0f}",
+        text_cache.stats(),
+        frame_regions.stats(),
+        frame_scheduler.stats(),
+        draw.stats(),
+        track_row_pool.stats(),
+        album_cache.stats(),
+        search_engine.stats(),
+        persistence.stats(),
+        playback.stats(),
+        crossfade.stats(),
+        playlists.stats(),
+        list_compositor.stats(),
+        decorations.stats(),
+    ]
+
+
+def draw_stats_overlay(surf):
+    lines = [render_text(line, F_SMALL, GRAY_L) for line in stats_lines()]
+    w = max(max(t.get_width() for t in lines) + 24, getattr(draw_stats_overlay, "width", 0))
+    draw_stats_overlay.width = w
+    h = len(lines) * 18 + 16
+    rect = pygame.Rect(WIDTH - w - 16, 16, w, h)
+    draw.rect(surf, (0, 0, 0), rect)
+    y = rect.y + 8
+    for t in lines:
+        surf.blit(t, (rect.x + 12, y))
+        y += 18
+    return rect
+
+
 nav_buttons = []
 playlist_buttons = []
-track_rows = []
+track_rows = {}
 search_box = None
 control_buttons = {}
 progress_slider = None
@@ -940,7 +2866,7 @@ create_sidebar_ui()
 
 
 def draw_sidebar(surf, mp):
-    pygame.draw.rect(surf, SIDEBAR, (0, 0, SIDEBAR_W, HEIGHT))
+    draw.rect(surf, SIDEBAR, (0, 0, SIDEBAR_W, HEIGHT))
     logo = render_text("Spotify Free", F_LOGO, WHITE)
     surf.blit(logo, (20, 28))
     for btn in nav_buttons:
@@ -948,7 +2874,7 @@ def draw_sidebar(surf, mp):
         btn.update(mp, active)
         btn.draw(surf)
     y = 90 + (44 * 6) + 10
-    pygame.draw.line(surf, DIVIDER, (20, y - 15), (SIDEBAR_W - 20, y - 15), 1)
+    draw.line(surf, DIVIDER, (20, y - 15), (SIDEBAR_W - 20, y - 15), 1)
     for btn in playlist_buttons:
         active = current_view == "playlist" and selected_playlist == btn.name
         btn.count = len(playlists.get(btn.name, []))
@@ -960,11 +2886,10 @@ def draw_content(surf, mp):
     global scroll_offset, max_scroll, track_rows, search_box, scrollbar_rect
     cx = SIDEBAR_W
     cw = WIDTH - SIDEBAR_W
-    for i in range(HEADER_H):
-        color = (BG[0] + int((GREEN_D[0] - BG[0]) * (1 - i / HEADER_H) * 0.3),
-                 BG[1] + int((GREEN_D[1] - BG[1]) * (1 - i / HEADER_H) * 0.3),
-                 BG[2] + int((GREEN_D[2] - BG[2]) * (1 - i / HEADER_H) * 0.3))
-        pygame.draw.line(surf, color, (cx, i), (cx + cw, i))
+    draw_content.current_row = None
+    track_rows = {}
+    surf.fill(BG, (cx, 0, cw, HEIGHT - PLAYER_H))
+    surf.blit(decorations.get(build_header_gradient, (cw, HEADER_H)), (cx, 0))
     if current_view == "search":
         title = "Search"
     elif current_view == "playlist" and selected_playlist:
@@ -988,7 +2913,11 @@ def draw_content(surf, mp):
     else:
         search_box = None
         lib = get_library()
-        inf = render_text(f"{len(lib)} songs", F_SUB, GRAY_D)
+        if library_scanner.active:
+            info_text = f"{len(lib)} songs - {library_scanner.scanned:,} / {library_scanner.total:,} scanned"
+        else:
+            info_text = f"{len(lib)} songs"
+        inf = render_text(info_text, F_SUB, GRAY_D)
         surf.blit(inf, (cx + 32, 95))
     if current_view == "settings":
         draw_settings_page(surf, mp, cx, cw)
@@ -1003,26 +2932,34 @@ def draw_content(surf, mp):
     for h, x in zip(headers, positions):
         t = render_text(h, F_TINY, GRAY_D)
         surf.blit(t, (x, list_y))
-    pygame.draw.line(surf, DIVIDER, (cx + 32, list_y + 24), (cx + cw - 32, list_y + 24), 1)
+    draw.line(surf, DIVIDER, (cx + 32, list_y + 24), (cx + cw - 32, list_y + 24), 1)
     list_cy = list_y + 36
     scroll_area = pygame.Rect(cx, list_cy, cw, list_h - 36)
     surf.set_clip(scroll_area)
     lib = get_library()
     content_h = len(lib) * TRACK_H
     max_scroll = max(0, content_h - list_h + 36)
-    y = list_cy - scroll_offset
-    track_rows = []
-    for i, track in enumerate(lib):
-        if y < list_cy - TRACK_H or y > list_cy + list_h:
-            track_rows.append(None)
-            y += TRACK_H
-            continue
-        rect = pygame.Rect(cx + 32, y, cw - 64, TRACK_H - 4)
-        track_row = TrackRow(rect, track, track["id"], positions, i)
+    top = ceil(scroll_offset)
+    track_row_pool.begin()
+    first = max(0, int(scroll_offset // TRACK_H))
+    last = min(len(lib), int((scroll_offset + list_h) // TRACK_H) + 1)
+    for i in range(first, last):
+        track = lib[i]
+        y = list_cy + i * TRACK_H - top
+        track_row = track_row_pool.acquire((cx + 32, y, cw - 64, TRACK_H - 4), track, track["id"], positions, i)
         track_row.update(mp, current_index)
-        track_row.draw(surf)
-        track_rows.append(track_row)
-        y += TRACK_H
+        track_rows[i] = track_row
+        if track_row.is_current:
+            draw_content.current_row = track_row
+    track_row_pool.end()
+    list_compositor.draw(surf, lib, positions, scroll_area, top)
+    wanted = {lib[i]["file"] for i in list_compositor.strip_range(lib)}
+    wanted.add(current_index)
+    album_cache.retain(wanted)
+    for track_row in track_rows.values():
+        if track_row.hovered or (track_row.is_current and is_playing):
+            surf.fill(BG, (cx, track_row.rect.y, cw, TRACK_H))
+            track_row.draw(surf)
     surf.set_clip(None)
     scrollbar_rect = None
     if max_scroll > 0:
@@ -1033,33 +2970,33 @@ def draw_content(surf, mp):
         color = GRAY_L if scrollbar_hovered else GRAY_D
         width = 6 if scrollbar_hovered else 4
         scrollbar_rect = pygame.Rect(cx + cw - 12, bar_y, width, bar_h)
-        pygame.draw.rect(surf, color, scrollbar_rect, border_radius=3)
+        draw.rect(surf, color, scrollbar_rect, border_radius=3)
 
 
 def draw_settings_page(surf, mp, cx, cw):
     section_x = cx + 32
     y = 120
-    label = F_SUB.render("Music Folder", True, WHITE)
+    label = render_text("Music Folder", F_SUB, WHITE)
     surf.blit(label, (section_x, y))
     y += 30
     folder_rect = pygame.Rect(section_x, y, min(500, cw - 100), 36)
-    pygame.draw.rect(surf, BTN, folder_rect, border_radius=12)
-    folder_text = F_BODY.render(settings.get("music_folder", ""), True, GRAY_L)
+    draw.rect(surf, BTN, folder_rect, border_radius=12)
+    folder_text = render_text(settings.get("music_folder", ""), F_BODY, GRAY_L)
     surf.blit(folder_text, (folder_rect.x + 10, folder_rect.centery - folder_text.get_height() // 2))
     y += 56
-    vol_label = F_SUB.render("Default Volume", True, WHITE)
+    vol_label = render_text("Default Volume", F_SUB, WHITE)
     surf.blit(vol_label, (section_x, y))
     y += 30
     vol_rect = pygame.Rect(section_x, y, 300, 20)
-    pygame.draw.rect(surf, BTN, vol_rect, border_radius=10)
+    draw.rect(surf, BTN, vol_rect, border_radius=10)
     fill = int(vol_rect.width * settings.get("volume", 0.7))
     if fill > 0:
         fill_rect = pygame.Rect(vol_rect.x, vol_rect.y, fill, vol_rect.height)
-        pygame.draw.rect(surf, GREEN, fill_rect, border_radius=10)
-    vol_text = F_BODY.render(f"{int(settings.get('volume', 0.7) * 100)}%", True, GRAY)
+        draw.rect(surf, GREEN, fill_rect, border_radius=10)
+    vol_text = render_text(f"{int(settings.get('volume', 0.7) * 100)}%", F_BODY, GRAY)
     surf.blit(vol_text, (vol_rect.x + vol_rect.width + 12, vol_rect.y - 3))
     y += 56
-    rep_label = F_SUB.render("Repeat Mode", True, WHITE)
+    rep_label = render_text("Repeat Mode", F_SUB, WHITE)
     surf.blit(rep_label, (section_x, y))
     y += 30
     btn_w = 120
@@ -1070,66 +3007,84 @@ def draw_settings_page(surf, mp, cx, cw):
         r = pygame.Rect(bx, y, btn_w, 34)
         hovered = r.collidepoint(mp)
         active = (settings.get("repeat_mode", REPEAT_OFF) == val)
-        pygame.draw.rect(surf, GREEN if active else (BTN_H if hovered else BTN), r, border_radius=17)
-        txt = F_BODY.render(nm, True, WHITE)
+        draw.rect(surf, GREEN if active else (BTN_H if hovered else BTN), r, border_radius=17)
+        txt = render_text(nm, F_BODY, WHITE)
         surf.blit(txt, (r.centerx - txt.get_width() // 2, r.centery - txt.get_height() // 2))
         rects.append((r, val))
         bx += btn_w + 12
     y += 56
-    mini_label = F_SUB.render("Mini Player Mode", True, WHITE)
+    fade_label = render_text("Crossfade", F_SUB, WHITE)
+    surf.blit(fade_label, (section_x, y))
+    y += 30
+    bx = section_x
+    fade_rects = []
+    for secs in CROSSFADE_CHOICES:
+        r = pygame.Rect(bx, y, 72, 34)
+        hovered = r.collidepoint(mp)
+        active = (settings.get("crossfade_seconds", 0) == secs)
+        draw.rect(surf, GREEN if active else (BTN_H if hovered else BTN), r, border_radius=17)
+        txt = render_text(f"{secs}s" if secs else "Off", F_BODY, WHITE)
+        surf.blit(txt, (r.centerx - txt.get_width() // 2, r.centery - txt.get_height() // 2))
+        fade_rects.append((r, secs))
+        bx += 72 + 12
+    y += 56
+    mini_label = render_text("Mini Player Mode", F_SUB, WHITE)
     surf.blit(mini_label, (section_x, y))
     y += 30
     mini_rect = pygame.Rect(section_x, y, 80, 34)
     mini_hovered = mini_rect.collidepoint(mp)
     mini_active = settings.get("mini_player", False)
-    pygame.draw.rect(surf, GREEN if mini_active else (BTN_H if mini_hovered else BTN), mini_rect, border_radius=17)
-    mini_txt = F_BODY.render("Toggle", True, WHITE)
+    draw.rect(surf, GREEN if mini_active else (BTN_H if mini_hovered else BTN), mini_rect, border_radius=17)
+    mini_txt = render_text("Toggle", F_BODY, WHITE)
     surf.blit(mini_txt, (mini_rect.centerx - mini_txt.get_width() // 2, mini_rect.centery - mini_txt.get_height() // 2))
     y += 56
-    save_txt = F_SMALL.render("Settings auto-saved when you change them.", True, GRAY)
+    save_txt = render_text("Settings auto-saved when you change them.", F_SMALL, GRAY)
     surf.blit(save_txt, (section_x, y))
 
     y += 80
-    pygame.draw.line(surf, DIVIDER, (section_x, y), (section_x + min(500, cw - 100), y), 1)
+    draw.line(surf, DIVIDER, (section_x, y), (section_x + min(500, cw - 100), y), 1)
     y += 40
 
-    credits_title = F_SUB.render("Credits", True, WHITE)
+    credits_title = render_text("Credits", F_SUB, WHITE)
     surf.blit(credits_title, (section_x, y))
     y += 30
 
-    made_by = F_BODY.render("Made by Aarush Mishra", True, GRAY_L)
+    made_by = render_text("Made by Aarush Mishra", F_BODY, GRAY_L)
     surf.blit(made_by, (section_x, y))
     y += 28
 
-    made_with = F_BODY.render("Made with Python and Love", True, GRAY_L)
+    made_with = render_text("Made with Python and Love", F_BODY, GRAY_L)
     surf.blit(made_with, (section_x, y))
 
     heart_x = section_x + made_with.get_width() + 8
     heart_y = y - 2
-    pygame.draw.circle(surf, (255, 100, 100), (heart_x + 4, heart_y + 4), 3)
-    pygame.draw.circle(surf, (255, 100, 100), (heart_x + 9, heart_y + 4), 3)
+    draw.circle(surf, (255, 100, 100), (heart_x + 4, heart_y + 4), 3)
+    draw.circle(surf, (255, 100, 100), (heart_x + 9, heart_y + 4), 3)
     points = [(heart_x + 1, heart_y + 6), (heart_x + 6.5, heart_y + 11), (heart_x + 12, heart_y + 6)]
-    pygame.draw.polygon(surf, (255, 100, 100), points)
+    draw.polygon(surf, (255, 100, 100), points)
 
     draw_settings_page._folder_rect = folder_rect
     draw_settings_page._vol_rect = vol_rect
     draw_settings_page._repeat_rects = rects
+    draw_settings_page._fade_rects = fade_rects
     draw_settings_page._mini_rect = mini_rect
 
 
+def queue_view():
+    key = (state_versions["queue"], state_versions["library"])
+    if getattr(queue_view, "key", None) != key:
+        queue_view.key = key
+        queue_view.items = [(qi, track_index[tid]) for qi, tid in enumerate(play_queue) if tid in track_index]
+    return queue_view.items
+
+
 def draw_queue_page(surf, mp, cx, cw):
     global queue_rows, scroll_offset, max_scroll, dragging_scrollbar, scroll_velocity, dragging_queue_item
     cx = SIDEBAR_W
     cw = WIDTH - SIDEBAR_W
     list_y = HEADER_H + 20
     list_h = HEIGHT - PLAYER_H - list_y - 10
-    for i in range(HEADER_H):
-        color = (
-            BG[0] + int((GREEN_D[0] - BG[0]) * (1 - i / HEADER_H) * 0.3),
-            BG[1] + int((GREEN_D[1] - BG[1]) * (1 - i / HEADER_H) * 0.3),
-            BG[2] + int((GREEN_D[2] - BG[2]) * (1 - i / HEADER_H) * 0.3)
-        )
-        pygame.draw.line(surf, color, (cx, i), (cx + cw, i))
+    surf.blit(decorations.get(build_header_gradient, (cw, HEADER_H)), (cx, 0))
     title = render_text("Queue", F_HEAD, WHITE)
     surf.blit(title, (cx + 32, 40))
     headers = ["#", "TITLE", "ARTIST", "DURATION"]
@@ -1137,12 +3092,8 @@ def draw_queue_page(surf, mp, cx, cw):
     for h, x in zip(headers, positions):
         t = render_text(h, F_TINY, GRAY_D)
         surf.blit(t, (x, list_y))
-    pygame.draw.line(surf, DIVIDER, (cx + 32, list_y + 24), (cx + cw - 32, list_y + 24), 1)
-    visible_songs = []
-    for tid in play_queue:
-        track = next((t for t in music_library if t["id"] == tid), None)
-        if track:
-            visible_songs.append(track)
+    draw.line(surf, DIVIDER, (cx + 32, list_y + 24), (cx + cw - 32, list_y + 24), 1)
+    visible_songs = queue_view()
     padding = 8
     row_height = int(TRACK_H * min(DPI_SCALE, 1.2))
     content_h = max(0, len(visible_songs) * (row_height + padding))
@@ -1155,66 +3106,64 @@ def draw_queue_page(surf, mp, cx, cw):
         return
     list_rect = pygame.Rect(cx + 32, list_cy, cw - 64, list_h - 36)
     surf.set_clip(list_rect)
-    y = list_cy - scroll_offset
-    queue_rows = []
-    draw_queue_page.rects = []
-    for i, track in enumerate(visible_songs):
-        rect = pygame.Rect(cx + 32, int(y), cw - 64, row_height)
-        y += row_height + padding
-        if rect.bottom < list_cy or rect.top > list_cy + list_rect.height:
-            queue_rows.append(None)
-            draw_queue_page.rects.append((None, None, None, track["id"]))
-            continue
+    queue_rows = {}
+    draw_queue_page.rects = {}
+    stride = row_height + padding
+    first = max(0, int(scroll_offset // stride))
+    last = min(len(visible_songs), int((scroll_offset + list_rect.height) // stride) + 1)
+    for i in range(first, last):
+        qi, track = visible_songs[i]
+        rect = pygame.Rect(cx + 32, int(list_cy - scroll_offset + i * stride), cw - 64, row_height)
         base_col = (28, 28, 28) if i % 2 == 0 else CARD
-        if dragging_queue_item == i:
-            pygame.draw.rect(surf, (60, 60, 60), rect, border_radius=12)
+        if dragging_queue_item == qi:
+            draw.rect(surf, (60, 60, 60), rect, border_radius=12)
         else:
-            pygame.draw.rect(surf, base_col, rect, border_radius=12)
+            draw.rect(surf, base_col, rect, border_radius=12)
         is_hover = rect.collidepoint(mp)
         if is_hover and dragging_queue_item is None:
             overlay = pygame.Surface((rect.width, rect.height), pygame.SRCALPHA)
             overlay.fill((255, 255, 255, 14))
             surf.blit(overlay, (rect.x, rect.y))
         else:
-            pygame.draw.line(surf, DIVIDER, (rect.x + 8, rect.bottom - 1), (rect.right - 8, rect.bottom - 1))
+            draw.line(surf, DIVIDER, (rect.x + 8, rect.bottom - 1), (rect.right - 8, rect.bottom - 1))
         nc = GREEN if track["id"] == current_index and is_playing else GRAY_D
-        idx_surf = F_SMALL.render(str(i + 1), True, nc)
+        idx_surf = render_text(str(i + 1), F_SMALL, nc)
         surf.blit(idx_surf, (positions[0], rect.centery - idx_surf.get_height() // 2))
-        title_surf = F_BODY.render(track["title"][:45], True, WHITE if track["id"] != current_index else GREEN)
-        artist_surf = F_SMALL.render(track["artist"][:36], True, GRAY)
-        dur_surf = F_SMALL.render(track["duration"], True, GRAY_D)
+        title_surf = render_text(track["title"][:45], F_BODY, WHITE if track["id"] != current_index else GREEN)
+        artist_surf = render_text(track["artist"][:36], F_SMALL, GRAY)
+        dur_surf = render_text(format_duration(track.get("length")), F_SMALL, GRAY_D)
         surf.blit(title_surf, (positions[1], rect.centery - title_surf.get_height() // 2))
         surf.blit(artist_surf, (positions[2], rect.centery - artist_surf.get_height() // 2))
         surf.blit(dur_surf, (positions[3], rect.centery - dur_surf.get_height() // 2))
 
         drag_rect = pygame.Rect(positions[0] - 30, rect.centery - 12, 20, 24)
         dh = drag_rect.collidepoint(mp)
-        pygame.draw.rect(surf, GRAY_L if dh else GRAY_D, (drag_rect.x + 4, drag_rect.y + 6, 2, 12), border_radius=1)
-        pygame.draw.rect(surf, GRAY_L if dh else GRAY_D, (drag_rect.x + 8, drag_rect.y + 6, 2, 12), border_radius=1)
-        pygame.draw.rect(surf, GRAY_L if dh else GRAY_D, (drag_rect.x + 12, drag_rect.y + 6, 2, 12), border_radius=1)
+        draw.rect(surf, GRAY_L if dh else GRAY_D, (drag_rect.x + 4, drag_rect.y + 6, 2, 12), border_radius=1)
+        draw.rect(surf, GRAY_L if dh else GRAY_D, (drag_rect.x + 8, drag_rect.y + 6, 2, 12), border_radius=1)
+        draw.rect(surf, GRAY_L if dh else GRAY_D, (drag_rect.x + 12, drag_rect.y + 6, 2, 12), border_radius=1)
 
         play_rect = pygame.Rect(rect.right - 150, rect.y + (rect.height - 28) // 2, 64, 28)
         rem_rect = pygame.Rect(rect.right - 80, rect.y + (rect.height - 28) // 2, 64, 28)
         ph = play_rect.collidepoint(mp)
         rh = rem_rect.collidepoint(mp)
         if ph:
-            pygame.draw.rect(surf, (60, 140, 220), play_rect.inflate(4, 4), border_radius=8)
-            txt = F_SMALL.render("Play", True, WHITE)
+            draw.rect(surf, (60, 140, 220), play_rect.inflate(4, 4), border_radius=8)
+            txt = render_text("Play", F_SMALL, WHITE)
             surf.blit(txt, (play_rect.centerx - txt.get_width() // 2, play_rect.centery - txt.get_height() // 2))
         else:
-            pygame.draw.rect(surf, (50, 120, 200), play_rect, border_radius=8)
-            txt = F_SMALL.render("Play", True, WHITE)
+            draw.rect(surf, (50, 120, 200), play_rect, border_radius=8)
+            txt = render_text("Play", F_SMALL, WHITE)
             surf.blit(txt, (play_rect.centerx - txt.get_width() // 2, play_rect.centery - txt.get_height() // 2))
         if rh:
-            pygame.draw.rect(surf, (180, 70, 70), rem_rect.inflate(4, 4), border_radius=8)
-            txt2 = F_SMALL.render("Remove", True, WHITE)
+            draw.rect(surf, (180, 70, 70), rem_rect.inflate(4, 4), border_radius=8)
+            txt2 = render_text("Remove", F_SMALL, WHITE)
             surf.blit(txt2, (rem_rect.centerx - txt2.get_width() // 2, rem_rect.centery - txt2.get_height() // 2))
         else:
-            pygame.draw.rect(surf, (150, 50, 50), rem_rect, border_radius=8)
-            txt2 = F_SMALL.render("Remove", True, WHITE)
+            draw.rect(surf, (150, 50, 50), rem_rect, border_radius=8)
+            txt2 = render_text("Remove", F_SMALL, WHITE)
             surf.blit(txt2, (rem_rect.centerx - txt2.get_width() // 2, rem_rect.centery - txt2.get_height() // 2))
-        draw_queue_page.rects.append((rem_rect, play_rect, drag_rect, track["id"]))
-        queue_rows.append(rect)
+        draw_queue_page.rects[qi] = (rem_rect, play_rect, drag_rect, track["id"])
+        queue_rows[qi] = rect
     surf.set_clip(None)
     if max_scroll > 0:
         bar_w = 6
@@ -1222,29 +3171,52 @@ def draw_queue_page(surf, mp, cx, cw):
         bar_y = list_cy + int((scroll_offset / max_scroll) * (list_rect.height - bar_h)) if max_scroll > 0 else list_cy
         bar_rect = pygame.Rect(cx + cw - 20, bar_y, bar_w, bar_h)
         hovered_bar = bar_rect.collidepoint(mp) or dragging_scrollbar
-        pygame.draw.rect(surf, GRAY_D if not hovered_bar else GRAY_L, bar_rect, border_radius=4)
+        draw.rect(surf, GRAY_D if not hovered_bar else GRAY_L, bar_rect, border_radius=4)
+
+
+def progress_geometry():
+    bw = min(800, WIDTH - 400)
+    bx = WIDTH // 2 - bw // 2
+    by = HEIGHT - PLAYER_H + 70
+    return bx, by, bw
+
+
+def progress_bar_rect():
+    bx, by, bw = progress_geometry()
+    return pygame.Rect(bx - 56, by - 12, bw + 112, 24)
+
+
+def draw_progress(surf, mp):
+    global progress_slider
+    bx, by, bw = progress_geometry()
+    draw.rect(surf, CARD, progress_bar_rect())
+    ct = format_time(progress)
+    tt = format_duration(progress_max)
+    cts = render_text(ct, F_TINY, GRAY_D)
+    tts = render_text(tt, F_TINY, GRAY_D)
+    surf.blit(cts, (bx - 50, by - 2))
+    surf.blit(tts, (bx + bw + 10, by - 2))
+    progress_slider = Slider((bx, by - 6, bw, 12))
+    progress_slider.update(mp, progress / progress_max if progress_max > 0 else 0, dragging_progress)
+    progress_slider.draw(surf)
 
 
 def draw_player(surf, mp):
-    global control_buttons, progress_slider, volume_slider
+    global control_buttons, volume_slider
     py = HEIGHT - PLAYER_H
-    pygame.draw.rect(surf, CARD, (0, py, WIDTH, PLAYER_H))
-    pygame.draw.line(surf, DIVIDER, (0, py), (WIDTH, py), 1)
+    draw.rect(surf, CARD, (0, py, WIDTH, PLAYER_H))
+    draw.line(surf, DIVIDER, (0, py), (WIDTH, py), 1)
     if current_index is not None:
-        track = next((t for t in music_library if t["id"] == current_index), None)
+        track = get_track(current_index)
         if track:
             art_size = 64
             art = pygame.Rect(20, py + 18, art_size, art_size)
-            album_art_surf = album_cache.get(track.get("file"))
+            album_art_surf = album_cache.get(track.get("file"), art_size)
             if album_art_surf:
                 surf.blit(album_art_surf, art)
             else:
-                for i in range(art_size):
-                    ratio = i / art_size
-                    color = (int(60 + ratio * 80), int(40 + ratio * 100), int(80 + ratio * 60))
-                    pygame.draw.rect(surf, color, (art.x, art.y + i, art_size, 1))
-                pygame.draw.circle(surf, GRAY_L, (art.centerx - 4, art.centery + 8), 6, 2)
-            pygame.draw.rect(surf, BTN, art, border_radius=6, width=2)
+                surf.blit(decorations.get(build_art_placeholder, art_size), art)
+            draw.rect(surf, BTN, art, border_radius=6, width=2)
             ttl = render_text(track["title"][:35], F_BOLD, WHITE)
             surf.blit(ttl, (art.right + 16, py + 28))
             art_text = render_text(track["artist"][:35], F_SMALL, GRAY)
@@ -1266,62 +3238,359 @@ def draw_player(surf, mp):
     play_btn = control_buttons["play"]
     play_btn.update(mp)
     color = GREEN_H if play_btn.hovered else GREEN
-    pygame.draw.circle(surf, color, (cx, cy + 8), 22)
+    draw.circle(surf, color, (cx, cy + 8), 22)
     if is_playing:
-        pygame.draw.rect(surf, WHITE, (cx - 6, cy + 2, 4, 12), border_radius=1)
-        pygame.draw.rect(surf, WHITE, (cx + 2, cy + 2, 4, 12), border_radius=1)
+        draw.rect(surf, WHITE, (cx - 6, cy + 2, 4, 12), border_radius=1)
+        draw.rect(surf, WHITE, (cx + 2, cy + 2, 4, 12), border_radius=1)
     else:
         points = [(cx - 4, cy + 2), (cx - 4, cy + 14), (cx + 8, cy + 8)]
-        pygame.draw.polygon(surf, WHITE, points)
-    bw = min(800, WIDTH - 400)
-    bx = cx - bw // 2
-    by = py + 70
-    ct = format_time(progress)
-    tt = format_time(progress_max)
-    cts = render_text(ct, F_TINY, GRAY_D)
-    tts = render_text(tt, F_TINY, GRAY_D)
-    surf.blit(cts, (bx - 50, by - 2))
-    surf.blit(tts, (bx + bw + 10, by - 2))
-    progress_slider = Slider((bx, by - 6, bw, 12))
-    progress_slider.update(mp, progress / progress_max if progress_max > 0 else 0, dragging_progress)
-    progress_slider.draw(surf)
+        draw.polygon(surf, WHITE, points)
+    draw_progress(surf, mp)
     vx = WIDTH - 220
     vy = py + 40
     vw = 120
     vol_icon_x = vx - 35
     if volume > 0:
-        pygame.draw.polygon(surf, GRAY, [(vol_icon_x, vy - 4), (vol_icon_x, vy + 4), (vol_icon_x + 4, vy + 4),
-                                         (vol_icon_x + 8, vy + 8), (vol_icon_x + 8, vy - 8), (vol_icon_x + 4, vy - 4)])
+        draw.polygon(surf, GRAY, [(vol_icon_x, vy - 4), (vol_icon_x, vy + 4), (vol_icon_x + 4, vy + 4),
+                                  (vol_icon_x + 8, vy + 8), (vol_icon_x + 8, vy - 8), (vol_icon_x + 4, vy - 4)])
         if volume > 0.3:
-            pygame.draw.arc(surf, GRAY, (vol_icon_x + 8, vy - 6, 8, 12), -0.7, 0.7, 2)
+            draw.arc(surf, GRAY, (vol_icon_x + 8, vy - 6, 8, 12), -0.7, 0.7, 2)
         if volume > 0.6:
-            pygame.draw.arc(surf, GRAY, (vol_icon_x + 12, vy - 10, 12, 20), -0.7, 0.7, 2)
+            draw.arc(surf, GRAY, (vol_icon_x + 12, vy - 10, 12, 20), -0.7, 0.7, 2)
     else:
-        pygame.draw.polygon(surf, GRAY, [(vol_icon_x, vy - 4), (vol_icon_x, vy + 4), (vol_icon_x + 4, vy + 4),
-                                         (vol_icon_x + 8, vy + 8), (vol_icon_x + 8, vy - 8), (vol_icon_x + 4, vy - 4)])
-        pygame.draw.line(surf, GRAY, (vol_icon_x + 10, vy - 6), (vol_icon_x + 18, vy + 6), 2)
+        draw.polygon(surf, GRAY, [(vol_icon_x, vy - 4), (vol_icon_x, vy + 4), (vol_icon_x + 4, vy + 4),
+                                  (vol_icon_x + 8, vy + 8), (vol_icon_x + 8, vy - 8), (vol_icon_x + 4, vy - 4)])
+        draw.line(surf, GRAY, (vol_icon_x + 10, vy - 6), (vol_icon_x + 18, vy + 6), 2)
     volume_slider = Slider((vx, vy - 6, vw, 12))
     volume_slider.update(mp, volume, dragging_volume)
     volume_slider.draw(surf)
 
 
-def play_track(track_id, from_pos=0.0):
+MUSIC_END = pygame.USEREVENT + 1
+
+
+class PlaybackEngine:
+    def __init__(self):
+        self.queued = None
+        self.upcoming = None
+        self.shuffle_pick = None
+        self.key = None
+        self.loaded = False
+        self.gapless = 0
+        mixer.music.set_endevent(MUSIC_END)
+
+    def invalidate(self):
+        self.key = None
+        self.queued = None
+        self.upcoming = None
+
+    def sync(self):
+        if not is_playing or current_index is None or not self.loaded:
+            return
+        get_library()
+        key = (current_index, state_versions["queue"], view_model.key, shuffle_mode, repeat_mode,
+               crossfade.seconds())
+        if key == self.key:
+            return
+        self.key = key
+        self.upcoming = None
+        choice = upcoming_track(natural_end=True)
+        if choice and not choice[1] and shuffle_mode and repeat_mode != REPEAT_ONE:
+            anchor = (current_index, state_versions["queue"])
+            if self.shuffle_pick and self.shuffle_pick[0] == anchor and get_track(self.shuffle_pick[1][0]):
+                choice = self.shuffle_pick[1]
+            else:
+                self.shuffle_pick = (anchor, choice)
+        track = get_track(choice[0]) if choice and choice[0] is not None else None
+        if track and track.get("file"):
+            self.upcoming = choice
+        if self.upcoming is None or crossfade.seconds():
+            if self.queued is not None:
+                self.unqueue()
+            return
+        if choice == self.queued:
+            return
+        try:
+            mixer.music.queue(track["file"])
+            self.queued = choice
+        except (pygame.error, Exception) as e:
+            print("Failed to preload next track:", e)
+            if self.queued is not None:
+                self.unqueue()
+
+    def unqueue(self):
+        self.queued = None
+        track = get_track(current_index)
+        if not track or not track.get("file"):
+            return
+        pos = progress + (pygame.time.get_ticks() - progress_timer) / 1000.0
+        try:
+            mixer.music.load(track["file"])
+            mixer.music.play(start=pos)
+        except (pygame.error, Exception) as e:
+            print("Failed to clear the preloaded track:", e)
+
+    def on_music_end(self):
+        if not is_playing or crossfade.started is not None:
+            return
+        queued = self.queued
+        self.invalidate()
+        if queued and mixer.music.get_busy():
+            track_id, from_queue = queued
+            if from_queue:
+                queue_pop_next()
+            begin_track(track_id)
+            self.gapless += 1
+        elif repeat_mode == REPEAT_ONE:
+            play_track(current_index)
+        else:
+            next_track()
+
+    def stats(self):
+        return f"playback: {self.gapless} gapless transitions"
+
+
+playback = PlaybackEngine()
+
+CROSSFADE_DONE = pygame.USEREVENT + 2
+CROSSFADE_CHOICES = (0, 3, 6, 9, 12)
+
+
+class Crossfader:
+    TICK_S = 0.02
+    HEAD_MARGIN = 1.5
+    MIN_FADE = 1.0
+    HEAD_SLACK_BYTES = 512 * 1024
+    MAX_FULL_DECODE_SECONDS = 300.0
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="crossfade-decode")
+        self.generation = 0
+        self.key = None
+        self.fade_key = None
+        self.choice = None
+        self.head = None
+        self.deadline = None
+        self.fade_ms = 0
+        self.started = None
+        self.done = False
+        self.paused_at = None
+        self.fades = 0
+        mixer.set_reserved(1)
+        self.channel = mixer.Channel(0)
+        threading.Thread(target=self.run, name="crossfade", daemon=True).start()
+
+    def seconds(self):
+        return settings.get("crossfade_seconds", DEFAULT_SETTINGS["crossfade_seconds"])
+
+    def sync(self):
+        fade = self.seconds()
+        if not is_playing or self.started is not None:
+            return
+        if not fade or playback.queued or not playback.upcoming:
+            if self.key is not None:
+                self.cancel()
+            return
+        key = (playback.key, fade)
+        if key != self.key and (self.choice, self.fade_key) == (playback.upcoming, fade):
+            self.key = key
+        elif key != self.key:
+            self.cancel()
+            self.key = key
+            self.fade_key = fade
+            self.choice = playback.upcoming
+            track = get_track(self.choice[0])
+            self.pool.submit(self._decode, self.generation, track["file"], track["length"], fade)
+        if self.head is None or progress_max <= 0:
+            return
+        now = pygame.time.get_ticks()
+        remaining = progress_max - progress - (now - progress_timer) / 1000.0
+        fade_len = min(fade, remaining, progress_max / 2)
+        with self.lock:
+            if fade_len < self.MIN_FADE:
+                self.deadline = None
+                return
+            deadline = now + int((remaining - fade_len) * 1000)
+            if self.deadline is not None and abs(deadline - self.deadline) < 50:
+                return
+            self.fade_ms = int(fade_len * 1000)
+            self.deadline = deadline
+        self.wake.set()
+
+    def _read_head(self, path, seconds, length):
+        file_size = os.path.getsize(path)
+        if length > 0:
+            budget = min(file_size, int(file_size * seconds / length * 1.5) + self.HEAD_SLACK_BYTES)
+        else:
+            budget = min(file_size, 4 * self.HEAD_SLACK_BYTES)
+        while True:
+            if budget >= file_size and not 0 < length <= self.MAX_FULL_DECODE_SECONDS:
+                return None
+            with open(path, "rb") as f:
+                data = f.read(budget)
+            try:
+                sound = mixer.Sound(file=io.BytesIO(data))
+            except pygame.error:
+                sound = None
+            if budget >= file_size or (sound is not None and sound.get_length() >= seconds):
+                return sound
+            budget = min(file_size, budget * 2)
+
+    def _decode(self, generation, path, length, fade):
+        if generation != self.generation:
+            return
+        try:
+            freq, size, channels = mixer.get_init()
+            decoded = self._read_head(path, fade + self.HEAD_MARGIN, length)
+            if decoded is None:
+                return
+            head_bytes = int((fade + self.HEAD_MARGIN) * freq) * (abs(size) // 8) * channels
+            head = mixer.Sound(buffer=memoryview(decoded).cast("B")[:head_bytes])
+            del decoded
+        except (pygame.error, Exception) as e:
+            print("Failed to decode crossfade head:", e)
+            return
+        if head.get_length() < fade + 0.5:
+            return
+        with self.lock:
+            if generation == self.generation:
+                self.head = head
+
+    def run(self):
+        while True:
+            self.wake.clear()
+            with self.lock:
+                timeout = self._tick(pygame.time.get_ticks())
+            self.wake.wait(timeout)
+
+    def _tick(self, now):
+        if self.paused_at is not None or self.done:
+            return None
+        if self.started is None:
+            if self.deadline is None or self.head is None:
+                return None
+            if now < self.deadline:
+                return (self.deadline - now) / 1000.0
+            self.started = now
+            self.deadline = None
+            mixer.music.set_endevent()
+            self.channel.set_volume(0.0)
+            self.channel.play(self.head)
+        t = min(1.0, (now - self.started) / max(1, self.fade_ms))
+        mixer.music.set_volume(volume * cos(t * pi / 2))
+        self.channel.set_volume(volume * sin(t * pi / 2))
+        if t < 1.0:
+            return self.TICK_S
+        self.done = True
+        pygame.event.post(pygame.event.Event(CROSSFADE_DONE, generation=self.generation))
+        return None
+
+    def finish(self, generation):
+        with self.lock:
+            if generation != self.generation or self.started is None:
+                return
+            elapsed = (pygame.time.get_ticks() - self.started) / 1000.0
+            track_id, from_queue = self.choice
+            self.started = None
+        if from_queue:
+            queue_remove(track_id)
+        self.cancel()
+        track = get_track(track_id)
+        try:
+            mixer.music.load(track["file"])
+            mixer.music.play(start=elapsed)
+        except (pygame.error, Exception) as e:
+            print("Crossfade handover failed; starting the track from the beginning:", e)
+            self.channel.stop()
+            if track:
+                play_track(track_id)
+            else:
+                next_track()
+            return
+        begin_track(track_id, elapsed)
+        playback.invalidate()
+        playback.loaded = True
+        self.channel.fadeout(80)
+        self.fades += 1
+
+    def abort(self):
+        with self.lock:
+            self.deadline = None
+            self.done = False
+            if self.started is not None:
+                self.started = None
+                self.channel.stop()
+            mixer.music.set_volume(volume)
+            mixer.music.set_endevent(MUSIC_END)
+
+    def cancel(self):
+        self.abort()
+        with self.lock:
+            self.generation += 1
+            self.key = None
+            self.choice = None
+            self.head = None
+            self.paused_at = None
+
+    def pause(self):
+        with self.lock:
+            self.paused_at = pygame.time.get_ticks()
+            self.deadline = None
+            if self.started is not None:
+                self.channel.pause()
+
+    def resume(self):
+        with self.lock:
+            if self.started is not None and self.paused_at is not None:
+                self.started += pygame.time.get_ticks() - self.paused_at
+                self.channel.unpause()
+            self.paused_at = None
+        self.wake.set()
+
+    def stats(self):
+        head_kb = 0
+        if self.head is not None:
+            freq, size, channels = mixer.get_init()
+            head_kb = int(self.head.get_length() * freq * (abs(size) // 8) * channels) // 1024
+        state = "fading" if self.started is not None else ("armed" if self.deadline is not None else "idle")
+        return f"crossfade: {self.seconds()}s {state}, {self.fades} fades, head {head_kb} KiB"
+
+
+crossfade = Crossfader()
+
+
+def begin_track(track_id, from_pos=0.0):
     global current_index, is_playing, progress, progress_max, progress_timer
-    track = next((t for t in music_library if t["id"] == track_id), None)
+    track = get_track(track_id)
     if not track:
-        return
+        return None
     current_index = track_id
     is_playing = True
     progress = from_pos
-    try:
-        m, s = map(int, track.get("duration", "0:00").split(":"))
-        progress_max = m * 60 + s
-    except Exception:
-        progress_max = 180.0
+    progress_max = track.get("length") or 0.0
+    if not progress_max and track.get("file"):
+        length_prober.request(track["file"])
     progress_timer = pygame.time.get_ticks()
+    if track_id not in play_history:
+        play_history.append(track_id)
+        bump_version("history")
+        save_history()
+    return track
+
+
+def play_track(track_id, from_pos=0.0):
+    track = begin_track(track_id, from_pos)
+    if not track:
+        return
+    crossfade.cancel()
+    playback.invalidate()
+    playback.loaded = False
     if track.get("file"):
         try:
             mixer.music.load(track["file"])
+            playback.loaded = True
             try:
                 mixer.music.play()
                 if from_pos and from_pos > 0:
@@ -1332,10 +3601,6 @@ def play_track(track_id, from_pos=0.0):
         except (pygame.error, FileNotFoundError, Exception) as e:
             print(f"Failed to play {track.get('file')}: {e}")
 
-    if track_id not in play_history:
-        play_history.append(track_id)
-        save_history()
-
 
 def toggle_play():
     global is_playing
@@ -1344,46 +3609,58 @@ def toggle_play():
             play_track(music_library[0]["id"])
         return
     is_playing = not is_playing
-    track = next((t for t in music_library if t["id"] == current_index), None)
+    track = get_track(current_index)
     if track and track.get("file"):
         try:
             if is_playing:
                 mixer.music.unpause()
+                crossfade.resume()
             else:
                 mixer.music.pause()
+                crossfade.pause()
         except pygame.error as e:
             print("Playback control error:", e)
 
 
-def next_track():
-    global current_index
-    next_in_queue = queue_pop_next()
-    if next_in_queue:
-        play_track(next_in_queue)
-        return
+def upcoming_track(natural_end=False):
+    if natural_end and repeat_mode == REPEAT_ONE and current_index is not None:
+        return current_index, False
+    if play_queue:
+        return play_queue[0], True
+    if current_index is None or not music_library:
+        return None
+    lib = get_library()
+    positions = view_model.positions
+    if not lib:
+        lib = music_library
+        positions = library_positions
+    current_track_idx = positions.get(current_index)
+    if current_track_idx is None:
+        return None
+    if shuffle_mode:
+        return lib[random.randint(0, len(lib) - 1)]["id"], False
+    if repeat_mode == REPEAT_ONE:
+        return current_index, False
+    if repeat_mode == REPEAT_ALL:
+        return lib[(current_track_idx + 1) % len(lib)]["id"], False
+    if current_track_idx + 1 < len(lib):
+        return lib[current_track_idx + 1]["id"], False
+    return None, False
 
-    if current_index is not None and music_library:
-        lib = get_library()
-        if not lib:
-            lib = music_library
 
-        current_track_idx = next((i for i, t in enumerate(lib) if t["id"] == current_index), None)
-        if current_track_idx is not None:
-            if shuffle_mode:
-                next_idx = random.randint(0, len(lib) - 1)
-                play_track(lib[next_idx]["id"])
-            else:
-                if repeat_mode == REPEAT_ONE:
-                    play_track(current_index)
-                elif repeat_mode == REPEAT_ALL:
-                    next_idx = (current_track_idx + 1) % len(lib)
-                    play_track(lib[next_idx]["id"])
-                else:
-                    if current_track_idx + 1 < len(lib):
-                        play_track(lib[current_track_idx + 1]["id"])
-                    else:
-                        is_playing = False
-                        mixer.music.stop()
+def next_track():
+    global is_playing
+    choice = upcoming_track()
+    if choice is None:
+        return
+    track_id, from_queue = choice
+    if track_id is None:
+        is_playing = False
+        mixer.music.stop()
+        return
+    if from_queue:
+        queue_pop_next()
+    play_track(track_id)
 
 
 def prev_track():
@@ -1394,23 +3671,265 @@ def prev_track():
 
     if current_index is not None and music_library:
         lib = get_library()
+        positions = view_model.positions
         if not lib:
             lib = music_library
-        current_track_idx = next((i for i, t in enumerate(lib) if t["id"] == current_index), None)
+            positions = library_positions
+        current_track_idx = positions.get(current_index)
         if current_track_idx is not None:
             prev_idx = (current_track_idx - 1) % len(lib)
             play_track(lib[prev_idx]["id"])
 
 
+class FrameRegions:
+    def __init__(self):
+        self.keys = {}
+        self.dirty = []
+        self.full = True
+        self.redraw_all = True
+        self.last_dirty_area = 0.0
+
+    def invalidate(self):
+        self.keys.clear()
+        self.full = True
+
+    def begin(self):
+        self.redraw_all = self.full
+        self.full = False
+        return self.redraw_all
+
+    def update(self, name, rect, key):
+        if not self.redraw_all and self.keys.get(name) == key:
+            return False
+        self.keys[name] = key
+        self.dirty.append(pygame.Rect(rect))
+        return True
+
+    def mark(self, rect):
+        self.dirty.append(pygame.Rect(rect))
+
+    def present(self):
+        if self.redraw_all:
+            self.last_dirty_area = 1.0
+            pygame.display.flip()
+        elif self.dirty:
+            area = sum(r.width * r.height for r in self.dirty)
+            self.last_dirty_area = min(1.0, area / float(WIDTH * HEIGHT))
+            pygame.display.update(self.dirty)
+        else:
+            self.last_dirty_area = 0.0
+        self.dirty = []
+        self.redraw_all = False
+
+    def stats(self):
+        return f"redrawn: {self.last_dirty_area * 100:.1f}% of window"
+
+
+def sidebar_state_key(mp):
+    hovered = None
+    if mp[0] < SIDEBAR_W:
+        for i, btn in enumerate(nav_buttons + playlist_buttons):
+            if btn.rect.collidepoint(mp):
+                hovered = i
+                break
+    return HEIGHT, current_view, selected_playlist, state_versions["playlists"], len(playlist_buttons), hovered
+
+
+def content_hover_key(mp):
+    cx = SIDEBAR_W
+    cw = WIDTH - SIDEBAR_W
+    if not (cx <= mp[0] < WIDTH and 0 <= mp[1] < HEIGHT - PLAYER_H):
+        return None
+    if current_view in ("settings", "queue"):
+        return mp
+    hover = [search_box is not None and search_box.rect.collidepoint(mp),
+             scrollbar_rect is not None and scrollbar_rect.collidepoint(mp)]
+    list_cy = HEADER_H + 56
+    row = int((mp[1] - list_cy + scroll_offset) // TRACK_H)
+    rect = pygame.Rect(cx + 32, list_cy - scroll_offset + row * TRACK_H, cw - 64, TRACK_H - 4)
+    if 0 <= row < len(get_library()) and rect.collidepoint(mp):
+        add_rect = pygame.Rect(rect.right - 210, rect.y + 14, 100, 28)
+        extra_rect = pygame.Rect(rect.right - 102, rect.y + 14, 80, 28)
+        hover.append((row, add_rect.collidepoint(mp), extra_rect.collidepoint(mp)))
+    return tuple(hover)
+
+
+def content_state_key(mp):
+    get_library()
+    key = (WIDTH, HEIGHT, view_model.key, scroll_offset, current_index, is_playing, content_hover_key(mp),
+           album_cache.version, search_query,
+           dragging_scrollbar, search_active and pygame.time.get_ticks() % 1000 < 500,
+           library_scanner.active, library_scanner.scanned, library_scanner.total)
+    if current_view == "queue":
+        key += (state_versions["queue"], dragging_queue_item, drag_offset)
+    elif current_view == "settings":
+        key += (tuple(settings.items()),)
+    return key
+
+
+def player_state_key(mp):
+    hover = None
+    if mp[1] >= HEIGHT - PLAYER_H and not progress_bar_rect().collidepoint(mp):
+        hover = mp
+    return (WIDTH, HEIGHT, current_index, is_playing, shuffle_mode, repeat_mode, volume, dragging_volume, hover,
+            album_cache.version)
+
+
+def progress_state_key(mp):
+    bx, by, bw = progress_geometry()
+    ratio = progress / progress_max if progress_max > 0 else 0
+    hovered = pygame.Rect(bx, by - 6, bw, 12).collidepoint(mp)
+    return bx, by, bw, int(progress), int(bw * ratio), format_duration(progress_max), dragging_progress, hovered
+
+
+def refresh_playing_indicator(surf):
+    row = getattr(draw_content, "current_row", None)
+    if row is None or not is_playing or current_view in ("settings", "queue"):
+        return None
+    list_cy = HEADER_H + 56
+    scroll_area = pygame.Rect(SIDEBAR_W, list_cy, WIDTH - SIDEBAR_W, HEIGHT - PLAYER_H - list_cy - 10)
+    rect = row.indicator_rect().clip(scroll_area)
+    if not rect.width or not rect.height:
+        return None
+    surf.set_clip(rect)
+    surf.fill(HOVER if row.hovered else BG, rect)
+    row.draw_indicator(surf)
+    surf.set_clip(None)
+    return rect
+
+
+class FrameScheduler:
+    ACTIVE_FPS = 60
+    ANIMATION_FPS = 15
+    IDLE_WAIT_MS = 1000
+    ACTIVE_GRACE_MS = 400
+
+    def __init__(self):
+        self.last_event = 0
+        self.visible = True
+        self.mode = "active"
+        self.last_wait = 0
+        self.woken = None
+
+    def note(self, e):
+        if e.type in (getattr(pygame, "WINDOWMINIMIZED", -1), getattr(pygame, "WINDOWHIDDEN", -1)):
+            self.visible = False
+        elif e.type in (getattr(pygame, "WINDOWRESTORED", -1), getattr(pygame, "WINDOWSHOWN", -1),
+                        getattr(pygame, "WINDOWEXPOSED", -1), getattr(pygame, "WINDOWMAXIMIZED", -1)):
+            self.visible = True
+        self.last_event = pygame.time.get_ticks()
+
+    def wait(self, busy, animating, timeout_ms):
+        recent = pygame.time.get_ticks() - self.last_event < self.ACTIVE_GRACE_MS
+        if self.visible and (busy or recent):
+            self.mode = "active"
+            clock.tick(self.ACTIVE_FPS)
+            return
+        if self.visible and animating:
+            self.mode = "animating"
+            clock.tick(self.ANIMATION_FPS)
+            return
+        self.mode = "idle" if self.visible else "hidden"
+        self.last_wait = max(1, min(self.IDLE_WAIT_MS, timeout_ms))
+        e = pygame.event.wait(self.last_wait)
+        if e.type != pygame.NOEVENT:
+            self.woken = e
+        clock.tick()
+
+    def events(self):
+        events = pygame.event.get()
+        if self.woken is not None:
+            events.insert(0, self.woken)
+            self.woken = None
+        return events
+
+    def stats(self):
+        if self.mode in ("idle", "hidden"):
+            return f"scheduler: {self.mode} (wait {self.last_wait} ms)"
+        return f"scheduler: {self.mode}"
+
+
+def frame_busy():
+    return (abs(scroll_velocity) > 0.1 or dragging_progress or dragging_volume or dragging_scrollbar
+            or dragging_queue_item is not None)
+
+
+def frame_animating():
+    return is_playing and getattr(draw_content, "current_row", None) is not None
+
+
+def next_wake_ms():
+    waits = [FrameScheduler.IDLE_WAIT_MS]
+    if is_playing and current_index is not None:
+        waits.append(int((1.0 - progress % 1.0) * 1000) + 1)
+        if progress_max > 0:
+            waits.append(int((progress_max - progress) * 1000) + 1)
+    if search_active:
+        waits.append(500 - pygame.time.get_ticks() % 500 + 1)
+    if persistence.dirty:
+        waits.append(persistence.next_flush_ms())
+    if library_scanner.backlog:
+        waits.append(1)
+    if library_scanner.active or length_prober.pending or album_cache.pending or search_engine.busy():
+        waits.append(100)
+    return min(waits)
+
+
+frame_regions = FrameRegions()
+frame_scheduler = FrameScheduler()
+overlay_was_open = False
+
+
 create_sidebar_ui()
 
 running = True
 while running:
+    apply_scan_results()
+    apply_length_probes()
+    apply_album_art()
+    search_engine.set_query(search_query)
+    search_engine.poll()
+    persistence.flush()
+    if is_playing and current_index is not None and not dragging_progress:
+        now = pygame.time.get_ticks()
+        elapsed = (now - progress_timer) / 1000.0
+        limit = progress_max if progress_max > 0 else FALLBACK_TRACK_LENGTH
+        progress = min(limit, progress + elapsed)
+        progress_timer = now
+        if progress >= limit and not playback.loaded:
+            if repeat_mode == REPEAT_ONE:
+                play_track(current_index)
+            else:
+                next_track()
+    playback.sync()
+    crossfade.sync()
+
     mp = pygame.mouse.get_pos()
-    screen.fill(BG)
-    draw_sidebar(screen, mp)
-    draw_content(screen, mp)
-    draw_player(screen, mp)
+    overlay_open = (playlist_context_menu["visible"] or confirm_delete["visible"] or show_shortcuts
+                    or show_create_playlist_popup or show_playlist_popup)
+    if overlay_open or overlay_was_open:
+        frame_regions.invalidate()
+    overlay_was_open = overlay_open
+    full_redraw = frame_regions.begin()
+    sidebar_rect = pygame.Rect(0, 0, SIDEBAR_W, HEIGHT - PLAYER_H)
+    if frame_regions.update("sidebar", sidebar_rect, sidebar_state_key(mp)):
+        screen.set_clip(sidebar_rect)
+        draw_sidebar(screen, mp)
+        screen.set_clip(None)
+    content_rect = pygame.Rect(SIDEBAR_W, 0, WIDTH - SIDEBAR_W, HEIGHT - PLAYER_H)
+    if frame_regions.update("content", content_rect, content_state_key(mp)):
+        draw_content(screen, mp)
+    else:
+        indicator_rect = refresh_playing_indicator(screen)
+        if indicator_rect:
+            frame_regions.mark(indicator_rect)
+    player_rect = pygame.Rect(0, HEIGHT - PLAYER_H, WIDTH, PLAYER_H)
+    player_dirty = frame_regions.update("player", player_rect, player_state_key(mp))
+    progress_dirty = frame_regions.update("progress", progress_bar_rect(), progress_state_key(mp))
+    if player_dirty:
+        draw_player(screen, mp)
+    elif progress_dirty:
+        draw_progress(screen, mp)
     draw_playlist_context_menu(screen, mp)
     if confirm_delete["visible"]:
         draw_confirm_delete(screen, mp)
@@ -1430,25 +3949,25 @@ while running:
         shadow_rect = popup_rect.copy();
         shadow_rect.x += 4;
         shadow_rect.y += 4
-        pygame.draw.rect(screen, (0, 0, 0), shadow_rect, border_radius=16)
-        pygame.draw.rect(screen, CARD, popup_rect, border_radius=16)
-        title = F_HEAD.render("Create Playlist", True, WHITE)
+        draw.rect(screen, (0, 0, 0), shadow_rect, border_radius=16)
+        draw.rect(screen, CARD, popup_rect, border_radius=16)
+        title = render_text("Create Playlist", F_HEAD, WHITE)
         screen.blit(title, (popup_x + 30, popup_y + 25))
         close_x = popup_x + popup_w - 50;
         close_y = popup_y + 25
         close_rect = pygame.Rect(close_x, close_y, 32, 32)
-        pygame.draw.line(screen, GRAY_L, (close_x + 8, close_y + 8), (close_x + 24, close_y + 24), 2)
-        pygame.draw.line(screen, GRAY_L, (close_x + 24, close_y + 8), (close_x + 8, close_y + 24), 2)
+        draw.line(screen, GRAY_L, (close_x + 8, close_y + 8), (close_x + 24, close_y + 24), 2)
+        draw.line(screen, GRAY_L, (close_x + 24, close_y + 8), (close_x + 8, close_y + 24), 2)
         input_y = popup_y + 90
         input_rect = pygame.Rect(popup_x + 30, input_y, popup_w - 60, 50)
-        pygame.draw.rect(screen, BTN_H if input_rect.collidepoint(mp) else BTN, input_rect, border_radius=8)
+        draw.rect(screen, BTN_H if input_rect.collidepoint(mp) else BTN, input_rect, border_radius=8)
         display_text = new_playlist_name if new_playlist_name else "Playlist name..."
         text_color = WHITE if new_playlist_name else GRAY_D
-        text_surf = F_SUB.render(display_text[:30], True, text_color)
+        text_surf = render_text(display_text[:30], F_SUB, text_color)
         screen.blit(text_surf, (input_rect.x + 16, input_rect.centery - text_surf.get_height() // 2))
         create_btn = pygame.Rect(popup_x + popup_w - 140, popup_y + popup_h - 60, 110, 40)
-        pygame.draw.rect(screen, GREEN_H if create_btn.collidepoint(mp) else GREEN, create_btn, border_radius=20)
-        create_text = F_BOLD.render("Create", True, WHITE)
+        draw.rect(screen, GREEN_H if create_btn.collidepoint(mp) else GREEN, create_btn, border_radius=20)
+        create_text = render_text("Create", F_BOLD, WHITE)
         screen.blit(create_text, (create_btn.centerx - create_text.get_width() // 2,
                                   create_btn.centery - create_text.get_height() // 2))
     elif show_playlist_popup:
@@ -1460,70 +3979,74 @@ while running:
         shadow_rect = popup_rect.copy();
         shadow_rect.x += 4;
         shadow_rect.y += 4
-        pygame.draw.rect(screen, (0, 0, 0), shadow_rect, border_radius=16)
-        pygame.draw.rect(screen, CARD, popup_rect, border_radius=16)
-        title = F_HEAD.render("Add to Playlist", True, WHITE)
+        draw.rect(screen, (0, 0, 0), shadow_rect, border_radius=16)
+        draw.rect(screen, CARD, popup_rect, border_radius=16)
+        title = render_text("Add to Playlist", F_HEAD, WHITE)
         screen.blit(title, (popup_x + 30, popup_y + 25))
         close_x = popup_x + popup_w - 50;
         close_y = popup_y + 25
         close_rect = pygame.Rect(close_x, close_y, 32, 32)
-        pygame.draw.line(screen, GRAY_L, (close_x + 8, close_y + 8), (close_x + 24, close_y + 24), 2)
-        pygame.draw.line(screen, GRAY_L, (close_x + 24, close_y + 8), (close_x + 8, close_y + 24), 2)
+        draw.line(screen, GRAY_L, (close_x + 8, close_y + 8), (close_x + 24, close_y + 24), 2)
+        draw.line(screen, GRAY_L, (close_x + 24, close_y + 8), (close_x + 8, close_y + 24), 2)
         create_btn_y = popup_y + 80
         create_btn_rect = pygame.Rect(popup_x + 20, create_btn_y, popup_w - 40, 50)
-        pygame.draw.rect(screen, BTN_H if create_btn_rect.collidepoint(mp) else BTN, create_btn_rect, border_radius=12)
-        pygame.draw.rect(screen, GREEN, create_btn_rect, border_radius=12, width=2)
+        draw.rect(screen, BTN_H if create_btn_rect.collidepoint(mp) else BTN, create_btn_rect, border_radius=12)
+        draw.rect(screen, GREEN, create_btn_rect, border_radius=12, width=2)
         plus_x = create_btn_rect.x + 20
         plus_y = create_btn_rect.centery
-        pygame.draw.line(screen, GREEN, (plus_x - 6, plus_y), (plus_x + 6, plus_y), 3)
-        pygame.draw.line(screen, GREEN, (plus_x, plus_y - 6), (plus_x, plus_y + 6), 3)
-        create_text = F_SUB.render("Create New Playlist", True, WHITE)
+        draw.line(screen, GREEN, (plus_x - 6, plus_y), (plus_x + 6, plus_y), 3)
+        draw.line(screen, GREEN, (plus_x, plus_y - 6), (plus_x, plus_y + 6), 3)
+        create_text = render_text("Create New Playlist", F_SUB, WHITE)
         screen.blit(create_text, (plus_x + 20, create_btn_rect.centery - create_text.get_height() // 2))
         playlist_popup_buttons = [(create_btn_rect, "CREATE_NEW", close_rect)]
         y = create_btn_y + 70
         for pname in playlists.keys():
             btn_rect = pygame.Rect(popup_x + 20, y, popup_w - 40, 60)
-            pygame.draw.rect(screen, BTN_H if btn_rect.collidepoint(mp) else BTN, btn_rect, border_radius=12)
+            draw.rect(screen, BTN_H if btn_rect.collidepoint(mp) else BTN, btn_rect, border_radius=12)
             icon_size = 44
             icon_x = btn_rect.x + 12
             icon_y = btn_rect.centery - icon_size // 2
-            icon_rect = pygame.Rect(icon_x, icon_y, icon_size, icon_size)
-            for i in range(icon_size):
-                ratio = i / icon_size
-                color = (int(30 + ratio * 50), int(215 - ratio * 100), int(96 - ratio * 20))
-                pygame.draw.rect(screen, color, (icon_x, icon_y + i, icon_size, 1))
-            pygame.draw.rect(screen, GREEN, icon_rect, border_radius=6)
-            name_text = F_SUB.render(pname, True, WHITE)
+            screen.blit(decorations.get(build_playlist_icon, icon_size), (icon_x, icon_y))
+            name_text = render_text(pname, F_SUB, WHITE)
             screen.blit(name_text, (icon_x + icon_size + 16, btn_rect.centery - 18))
-            count_text = F_SMALL.render(f"{len(playlists[pname])} songs", True, GRAY)
+            count_text = render_text(f"{len(playlists[pname])} songs", F_SMALL, GRAY)
             screen.blit(count_text, (icon_x + icon_size + 16, btn_rect.centery + 4))
             playlist_popup_buttons.append((btn_rect, pname, close_rect))
             y += 70
 
+    if show_stats:
+        frame_regions.mark(draw_stats_overlay(screen))
+
     if abs(scroll_velocity) > 0.1:
         scroll_offset += scroll_velocity
         scroll_offset = max(0.0, min(max_scroll, scroll_offset))
         scroll_velocity *= 0.92
 
-    if is_playing and current_index is not None and not dragging_progress:
-        now = pygame.time.get_ticks()
-        elapsed = (now - progress_timer) / 1000.0
-        progress = min(progress_max, progress + elapsed)
-        progress_timer = now
-        if progress >= progress_max - 0.5:
-            if repeat_mode == REPEAT_ONE:
-                play_track(current_index)
-            else:
-                next_track()
-
-    for e in pygame.event.get():
+    for e in frame_scheduler.events():
+        frame_scheduler.note(e)
         if e.type == pygame.QUIT:
             running = False
 
+        if e.type == MUSIC_END:
+            playback.on_music_end()
+
+        if e.type == CROSSFADE_DONE:
+            crossfade.finish(e.generation)
+
         if e.type == pygame.VIDEORESIZE:
             WIDTH, HEIGHT = e.w, e.h
             screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE | pygame.SCALED)
             create_sidebar_ui()
+            decorations.invalidate()
+            frame_regions.invalidate()
+
+        if e.type == getattr(pygame, "WINDOWDISPLAYCHANGED", -1):
+            refresh_dpi()
+            track_row_pool.clear()
+            frame_regions.invalidate()
+
+        if e.type in (pygame.VIDEOEXPOSE, getattr(pygame, "WINDOWEXPOSED", -1), getattr(pygame, "WINDOWRESTORED", -1)):
+            frame_regions.invalidate()
 
         if e.type == pygame.KEYDOWN:
             if e.key == pygame.K_ESCAPE:
@@ -1549,6 +4072,16 @@ while running:
                 show_shortcuts = not show_shortcuts
                 continue
 
+            if e.key == pygame.K_F3:
+                show_stats = not show_stats
+                if show_stats:
+                    draw.enable()
+                else:
+                    draw.disable()
+                draw_stats_overlay.width = 0
+                frame_regions.invalidate()
+                continue
+
             if show_shortcuts:
                 continue
 
@@ -1557,8 +4090,7 @@ while running:
                     new_playlist_name = new_playlist_name[:-1]
                 elif e.key == pygame.K_RETURN:
                     if new_playlist_name.strip():
-                        playlists[new_playlist_name.strip()] = []
-                        save_playlists()
+                        playlists.create(new_playlist_name.strip())
                         create_sidebar_ui()
                     show_create_playlist_popup = False
                     new_playlist_name = ""
@@ -1609,8 +4141,7 @@ while running:
                     new_playlist_name = ""
                 elif create_btn and create_btn.collidepoint(mx, my):
                     if new_playlist_name.strip():
-                        playlists[new_playlist_name.strip()] = []
-                        save_playlists()
+                        playlists.create(new_playlist_name.strip())
                         create_sidebar_ui()
                     show_create_playlist_popup = False
                     new_playlist_name = ""
@@ -1637,11 +4168,7 @@ while running:
                 if confirm_delete["yes_rect"] and confirm_delete["yes_rect"].collidepoint(mx, my):
                     pname = confirm_delete["playlist"]
                     if pname in playlists:
-                        try:
-                            del playlists[pname]
-                        except Exception:
-                            playlists.pop(pname, None)
-                        save_playlists()
+                        playlists.delete(pname)
                         create_sidebar_ui()
                         if selected_playlist == pname:
                             selected_playlist = None
@@ -1725,13 +4252,15 @@ while running:
                     new_progress = progress_max * progress_slider.get_value_at_pos(mx)
                     progress = new_progress
                     progress_timer = pygame.time.get_ticks()
-                    track = next((t for t in music_library if t["id"] == current_index), None)
+                    track = get_track(current_index)
                     if track and track.get("file"):
+                        crossfade.abort()
                         try:
                             mixer.music.set_pos(new_progress)
                         except (pygame.error, Exception) as e:
                             try:
                                 mixer.music.play()
+                                playback.invalidate()
                             except Exception:
                                 print("Seeking fallback failed:", e)
 
@@ -1760,7 +4289,7 @@ while running:
                             scroll_velocity = 0
 
                 clicked_track = False
-                for track_row in track_rows:
+                for track_row in track_rows.values():
                     if track_row:
                         action = track_row.handle_click((mx, my))
                         if action == "play":
@@ -1784,12 +4313,18 @@ while running:
                     r_vol = getattr(draw_settings_page, "_vol_rect", None)
                     r_reps = getattr(draw_settings_page, "_repeat_rects", None)
                     r_mini = getattr(draw_settings_page, "_mini_rect", None)
+                    r_fades = getattr(draw_settings_page, "_fade_rects", None)
                     if r_reps:
                         for rr, val in r_reps:
                             if rr.collidepoint(mx, my):
                                 settings["repeat_mode"] = val
                                 repeat_mode = val
                                 save_settings()
+                    if r_fades:
+                        for rr, secs in r_fades:
+                            if rr.collidepoint(mx, my):
+                                settings["crossfade_seconds"] = secs
+                                save_settings()
                     if r_vol and r_vol.collidepoint(mx, my):
                         rel = (mx - r_vol.x) / r_vol.width
                         rel = max(0.0, min(1.0, rel))
@@ -1808,7 +4343,7 @@ while running:
                         draw_settings_page.editing_folder = False
 
                 if current_view == "queue" and hasattr(draw_queue_page, "rects"):
-                    for idx, quad in enumerate(getattr(draw_queue_page, "rects", [])[:]):
+                    for idx, quad in list(draw_queue_page.rects.items()):
                         if len(quad) == 4:
                             rem_rect, p_rect, drag_rect, tid = quad
                             if drag_rect and drag_rect.collidepoint(mx, my):
@@ -1821,10 +4356,7 @@ while running:
                                 break
                             if p_rect and p_rect.collidepoint(mx, my):
                                 play_track(tid)
-                                try:
-                                    play_queue.remove(tid)
-                                except ValueError:
-                                    pass
+                                queue_remove(tid)
                                 break
 
             if e.button == 3:
@@ -1867,8 +4399,9 @@ while running:
                 new_progress = progress_max * progress_slider.get_value_at_pos(e.pos[0])
                 progress = new_progress
                 progress_timer = pygame.time.get_ticks()
-                track = next((t for t in music_library if t["id"] == current_index), None)
+                track = get_track(current_index)
                 if track and track.get("file"):
+                    crossfade.abort()
                     try:
                         mixer.music.set_pos(new_progress)
                     except (pygame.error, Exception):
@@ -1905,7 +4438,10 @@ while running:
                     except Exception as e:
                         print("Invalid folder path:", e)
                 music_folder = settings.get("music_folder", music_folder)
-                music_library = scan_music_folder(music_folder)
+                music_library.clear()
+                rebuild_track_index()
+                search_index.clear()
+                library_scanner.start(music_folder)
                 save_settings()
                 draw_settings_page.editing_folder = False
             elif ev.key == pygame.K_BACKSPACE:
@@ -1915,11 +4451,16 @@ while running:
                 if ev.unicode and len(getattr(draw_settings_page, "folder_input", "")) < 260:
                     draw_settings_page.folder_input = getattr(draw_settings_page, "folder_input", "") + ev.unicode
 
-    pygame.display.flip()
-    clock.tick(60)
+    frame_regions.present()
+    if show_stats:
+        draw.end_frame(full_redraw)
+    frame_scheduler.wait(frame_busy(), frame_animating(), next_wake_ms())
 
+library_scanner.stop()
 save_settings()
 save_playlists()
 save_history()
+persistence.flush(force=True)
+album_cache.close()
 pygame.quit()
 sys.exit()
\ No newline at end of file